@@ -0,0 +1,164 @@
+import struct
+from array import array
+from datetime import datetime
+
+# Columnar decoder for the raw attendance buffer.
+#
+# pyzk's get_attendance() slices the buffer record by record (quadratic in
+# the log size), builds a datetime and an Attendance object for every record,
+# and calls get_users() on every read. With large logs almost all of that is
+# thrown away by dedup a moment later. This module reads the same buffer
+# (read_with_buffer(CMD_ATTLOG_RRQ)) straight into compact columns:
+#
+#   cols = read_attendance(conn, users)      # users: the roster you already have
+#   fresh = cols.select(lambda key: key not in index)   # [(row, "<user_id>_<YYYY-mm-dd HH:MM:SS>")]
+#   logs = cols.records(i for i, _ in fresh)            # Attendance objects only for these rows
+#
+# Rows are unpacked with struct.iter_unpack over a memoryview, so the buffer
+# is never copied. If NumPy is installed it is used for the time arithmetic.
+# Connections without read_with_buffer (simulated devices, old pyzk) fall back
+# to get_attendance().
+# See bench_attendance_decode.py for numbers.
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CMD_ATTLOG_RRQ = 13  # zk.const.CMD_ATTLOG_RRQ
+FORMATS = {
+    8: struct.Struct("<HBIB"),           # uid, status, time, punch
+    16: struct.Struct("<IIBB6x"),        # user_id, time, status, punch, (reserved, workcode)
+    40: struct.Struct("<H24sBIB8x"),     # uid, user_id, status, time, punch, (space)
+}
+DAY = 24 * 60 * 60
+
+
+def decode_time(t):
+    """Device time (zkemsdk EncodeTime) -> datetime, same as pyzk."""
+    day, sod = divmod(t, DAY)
+    return datetime(day // 372 + 2000, day // 31 % 12 + 1, day % 31 + 1, sod // 3600, sod // 60 % 60, sod % 60)
+
+
+class AttendanceColumns:
+    """One attendance read as parallel columns; row i is (user_ids[i], times[i], ...)."""
+
+    def __init__(self, user_ids, uids, times, status, punch):
+        self.user_ids = user_ids  # list of str (shared objects for repeated ids)
+        self.uids = uids          # array('I'), or a list for 16-byte records (pyzk reports unknown ids as str)
+        self.times = times        # array('I') of raw device times
+        self.status = status      # array('B')
+        self.punch = punch        # array('B')
+        self._keys = None
+        self._objects = None      # rows that came in as objects (fallback path)
+
+    @classmethod
+    def from_records(cls, logs):
+        """Wraps Attendance objects from get_attendance() (fallback path)."""
+        cols = cls([str(lg.user_id) for lg in logs], [getattr(lg, "uid", 0) for lg in logs],
+                   array("I"), array("B", (lg.status & 0xFF for lg in logs)), array("B", (lg.punch & 0xFF for lg in logs)))
+        cols._objects = logs
+        cols._keys = [f"{uid}_{lg.timestamp.strftime('%Y-%m-%d %H:%M:%S')}" for uid, lg in zip(cols.user_ids, logs)]
+        return cols
+
+    def __len__(self):
+        return len(self._objects) if self._objects is not None else len(self.times)
+
+    def _iter_keys(self):
+        if self._keys is not None:
+            yield from self._keys
+            return
+        days, sods = {}, {}
+        if np is not None and len(self.times):
+            t = np.frombuffer(self.times, dtype=np.uint32)
+            day_col, sod_col = (t // DAY).tolist(), (t % DAY).tolist()
+        else:
+            day_col = (t // DAY for t in self.times)
+            sod_col = (t % DAY for t in self.times)
+        # dates and times of day repeat a lot: format each distinct one once
+        for uid, day, sod in zip(self.user_ids, day_col, sod_col):
+            d = days.get(day)
+            if d is None:
+                d = days[day] = f"{day // 372 + 2000:04d}-{day // 31 % 12 + 1:02d}-{day % 31 + 1:02d} "
+            s = sods.get(sod)
+            if s is None:
+                s = sods[sod] = f"{sod // 3600:02d}:{sod // 60 % 60:02d}:{sod % 60:02d}"
+            yield f"{uid}_{d}{s}"
+
+    def keys(self):
+        """Dedup keys for every row, formatted without building datetimes."""
+        if self._keys is None:
+            self._keys = list(self._iter_keys())
+        return self._keys
+
+    def select(self, keep):
+        """[(row, key)] for rows whose key passes keep(key); other keys are never stored."""
+        return [(i, k) for i, k in enumerate(self._iter_keys()) if keep(k)]
+
+    def records(self, rows=None):
+        """Attendance objects for the given row numbers (all rows if None)."""
+        rows = range(len(self)) if rows is None else list(rows)
+        if self._objects is not None:
+            return [self._objects[i] for i in rows]
+        from zk.attendance import Attendance
+        return [Attendance(self.user_ids[i], decode_time(self.times[i]), self.status[i], self.punch[i], self.uids[i]) for i in rows]
+
+
+def decode_buffer(data, record_size, users=None):
+    """Raw attendance bytes (without the 4-byte size header) -> AttendanceColumns.
+    users: pyzk User objects, used like pyzk does to map uid <-> user_id."""
+    fmt = FORMATS.get(record_size, FORMATS[40])
+    view = memoryview(data)
+    view = view[:len(view) - len(view) % fmt.size]
+    # one pass straight into the columns: no per-row tuples are kept around
+    user_ids, times, status, punch = [], array("I"), array("B"), array("B")
+    add_user, add_time, add_status, add_punch = user_ids.append, times.append, status.append, punch.append
+    if fmt.size == 8:
+        uids = array("I")
+        add_uid = uids.append
+        by_uid = {u.uid: u.user_id for u in users or ()}
+        for uid, st, t, p in fmt.iter_unpack(view):
+            add_uid(uid); add_status(st); add_time(t); add_punch(p)
+            add_user(by_uid.get(uid) or str(uid))
+    elif fmt.size == 16:
+        uids = []
+        add_uid = uids.append
+        # the raw id is the user_id; pyzk's fallback match on uid compares int with str and
+        # never hits, so an unknown id keeps its own number (matching it would credit someone else)
+        by_user_id = {u.user_id: u.uid for u in users or ()}
+        resolved = {}  # raw id -> (user_id, uid), looked up once per distinct id
+        for raw, t, st, p in fmt.iter_unpack(view):
+            hit = resolved.get(raw)
+            if hit is None:
+                uid_str = str(raw)
+                hit = (uid_str, by_user_id[uid_str]) if uid_str in by_user_id else (uid_str, uid_str)
+                resolved[raw] = hit
+            add_user(hit[0]); add_uid(hit[1]); add_time(t); add_status(st); add_punch(p)
+    else:
+        uids = array("I")
+        add_uid = uids.append
+        decoded = {}  # raw 24-byte field -> user_id str, shared by every row of that user
+        for uid, raw, st, t, p in fmt.iter_unpack(view):
+            user_id = decoded.get(raw)
+            if user_id is None:
+                user_id = decoded[raw] = raw.split(b"\x00")[0].decode(errors="ignore")
+            add_uid(uid); add_user(user_id); add_status(st); add_time(t); add_punch(p)
+    return AttendanceColumns(user_ids, uids, times, status, punch)
+
+
+def read_attendance(conn, users=None):
+    """Full attendance read from a pyzk connection as columns."""
+    if not hasattr(conn, "read_with_buffer"):
+        return AttendanceColumns.from_records(conn.get_attendance())
+    conn.read_sizes()
+    if not conn.records:
+        return decode_buffer(b"", 40)
+    if users is None:
+        users = conn.get_users()
+    data, size = conn.read_with_buffer(CMD_ATTLOG_RRQ)
+    if size < 4:
+        return decode_buffer(b"", 40)
+    total_size = struct.unpack_from("<I", data, 0)[0]
+    # like pyzk: 8 and 16 byte records are recognised exactly, anything else is read as 40
+    record_size = total_size // conn.records if total_size % conn.records == 0 else 40
+    return decode_buffer(memoryview(data)[4:], record_size, users)
@@ -0,0 +1,122 @@
+import sys
+import time
+import random
+import struct
+import argparse
+import tracemalloc
+from zk import ZK
+from zk.user import User
+from attendance_decoder import read_attendance, np
+
+# Micro-benchmark: pyzk's get_attendance() decode vs attendance_decoder on the
+# same synthetic buffer. Both run against a ZK object whose device replies are
+# canned, so only decoding (plus dedup) is measured, not the network.
+#
+#   python bench_attendance_decode.py --records 2000,10000,30000 --size 40 --fresh 0.01
+#
+# "fresh" is the share of rows not yet in the dedup index; the columnar path
+# only builds Attendance objects for those.
+
+USERS = 500
+
+
+def encode_time(y, mo, d, h, mi, s):
+    return (((y % 100) * 12 * 31 + (mo - 1) * 31 + d - 1) * 86400) + (h * 60 + mi) * 60 + s
+
+
+def make_buffer(n, size, users):
+    rnd = random.Random(42)
+    recs = []
+    for _ in range(n):
+        u = rnd.choice(users)
+        t = encode_time(2026, rnd.randint(1, 12), rnd.randint(1, 28), rnd.randint(6, 20), rnd.randint(0, 59), rnd.randint(0, 59))
+        if size == 8:
+            recs.append(struct.pack("<HBIB", u.uid, 1, t, 1))
+        elif size == 16:
+            # some ids are not on the roster but equal another user's uid: both decoders must keep them as-is
+            raw = u.uid if rnd.random() < 0.05 else int(u.user_id)
+            recs.append(struct.pack("<IIBB2sI", raw, t, 1, 1, b"\0\0", 0))
+        else:
+            recs.append(struct.pack("<H24sBIB8s", u.uid, u.user_id.encode(), 1, t, 1, b"\0" * 8))
+    body = b"".join(recs)
+    return struct.pack("<I", len(body)) + body
+
+
+class CannedZK(ZK):
+    """Real pyzk decode code; read_sizes/get_users/read_with_buffer answer from memory."""
+
+    def __init__(self, data, records, users):
+        super().__init__("127.0.0.1")
+        self.data, self.n, self.users = data, records, users
+
+    def read_sizes(self):
+        self.records = self.n
+        return True
+
+    def get_users(self):
+        return self.users
+
+    def read_with_buffer(self, command, fct=0, ext=0):
+        return self.data, len(self.data)
+
+
+def key_of(log):
+    return f"{log.user_id}_{log.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+def run_pyzk(conn, index):
+    logs = conn.get_attendance()
+    return [lg for lg in logs if key_of(lg) not in index]
+
+
+def run_columns(conn, index, users):
+    cols = read_attendance(conn, users)
+    return cols.records(i for i, _ in cols.select(lambda key: key not in index))
+
+
+def measure(fn, *args):
+    """(result, seconds, peak bytes); memory is traced in a second run so it doesn't skew the timing"""
+    t0 = time.perf_counter()
+    out = fn(*args)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark attendance buffer decoding")
+    parser.add_argument("--records", default="2000,10000,30000", help="comma-separated log sizes")
+    parser.add_argument("--size", type=int, choices=(8, 16, 40), default=40, help="record size the device uses")
+    parser.add_argument("--fresh", type=float, default=0.01, help="share of rows not yet processed")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    users = [User(i + 1, f"Employee {i}", 0, "", "", str(1000 + i), 0) for i in range(USERS)]
+    print(f"{args.size}-byte records, {args.fresh:.0%} fresh, numpy {'on' if np is not None else 'off'}")
+    print(f"{'records':>8} {'pyzk ms':>9} {'columns ms':>11} {'speedup':>8} {'pyzk MB':>8} {'columns MB':>11}")
+    for n in (int(x) for x in args.records.split(",")):
+        data = make_buffer(n, args.size, users)
+        conn = CannedZK(data, n, users)
+        all_keys = [key_of(lg) for lg in conn.get_attendance()]
+        index = set(random.Random(1).sample(all_keys, int(len(all_keys) * (1 - args.fresh))))
+
+        best_a = best_b = float("inf")
+        for _ in range(args.repeat):
+            fresh_a, ta, mem_a = measure(run_pyzk, conn, index)
+            fresh_b, tb, mem_b = measure(run_columns, conn, index, users)
+            best_a, best_b = min(best_a, ta), min(best_b, tb)
+        same = ([(lg.user_id, lg.timestamp, lg.status, lg.punch, lg.uid) for lg in fresh_a]
+                == [(lg.user_id, lg.timestamp, lg.status, lg.punch, lg.uid) for lg in fresh_b])
+        if not same:
+            print(f"❌ {n}: decoders disagree")
+            return 1
+        print(f"{n:>8} {best_a * 1000:>9.1f} {best_b * 1000:>11.1f} {best_a / best_b:>7.1f}x "
+              f"{mem_a / 2**20:>8.1f} {mem_b / 2**20:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
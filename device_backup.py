@@ -0,0 +1,361 @@
+import os
+import json
+import gzip
+import time
+import base64
+import hashlib
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+from zk import ZK
+from zk.user import User
+from zk.finger import Finger
+from device_config import load_devices
+from device_lockout import LockoutMeter, LockoutExceeded
+from transport_tuning import transport_settings
+from main import WRITE_BATCH, pick_device
+
+# Full-device snapshots, for swapping a failed terminal in minutes.
+#
+#   python device_backup.py backup "Main (1st Floor)"            # -> Main_1st_Floor_20261019-093000.zkb
+#   python device_backup.py show Main_1st_Floor_20261019-093000.zkb
+#   python device_backup.py restore Main_1st_Floor_20261019-093000.zkb "Main (1st Floor)"
+#
+# A snapshot is one gzip'd JSON file: a format tag and version, the device's
+# settings as read at backup time, and every user with card and fingerprint
+# templates (base64) nested under it, sealed with a sha256 of the users. Both
+# the user table and all templates come off the device in one bulk read each.
+#
+# Restore compares the snapshot with what the new terminal already holds and
+# writes only users that differ, WRITE_BATCH per lockout like transfer_users.
+# Each user goes up together with its templates in one buffered upload
+# (HR_save_usertemplates uploads a whole batch at once where pyzk has it).
+# Everything is then read back and compared; mismatches get one more write
+# pass. Settings the protocol cannot write (name, network, ...) are compared
+# and listed for whoever is fitting the unit; the clock is set from this PC.
+#
+# Snapshots hold passwords and biometrics: store them like the devices' admin
+# credentials.
+
+SNAPSHOT_FORMAT = "zk-snapshot"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_EXT = ".zkb"
+USER_FIELDS = ("uid", "user_id", "name", "privilege", "password", "group_id", "card")
+SETTINGS = {  # snapshot key -> pyzk getter
+    "name": "get_device_name",
+    "serial": "get_serialnumber",
+    "platform": "get_platform",
+    "firmware": "get_firmware_version",
+    "fp_version": "get_fp_version",
+    "face_version": "get_face_version",
+    "mac": "get_mac",
+    "network": "get_network_params",
+    "pin_width": "get_pin_width",
+}
+PER_UNIT = {"serial", "mac"}  # expected to differ on a replacement unit
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class Timings:
+    """Wall time per phase, printed in the order the phases ran."""
+
+    def __init__(self):
+        self.phases = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, label):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((label, time.perf_counter() - t0))
+
+    def report(self):
+        for label, seconds in self.phases:
+            print(f"  {label:<20} {seconds:7.2f}s")
+        print(f"  {'total':<20} {time.perf_counter() - self.started:7.2f}s")
+
+
+def connect(device):
+    return ZK(device["ip"], port=device.get("port", 4370), **transport_settings(device)).connect()
+
+
+def rescue_for(device):
+    """Watchdog rescue: re-enables the device over a second connection."""
+    def rescue():
+        conn = connect(device)
+        try: conn.enable_device()
+        finally: conn.disconnect()
+    return rescue
+
+
+# --- Snapshot file ---
+def user_record(user, fingers=()):
+    rec = {f: getattr(user, f, None) for f in USER_FIELDS}
+    rec["card"] = int(rec["card"] or 0)
+    rec["fingers"] = sorted([f.fid, f.valid, base64.b64encode(f.template).decode("ascii")] for f in fingers)
+    return rec
+
+
+def seal(users):
+    return hashlib.sha256(json.dumps(users, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def read_settings(conn):
+    settings = {}
+    for key, getter in SETTINGS.items():
+        try:
+            value = getattr(conn, getter)()
+        except Exception:
+            value = None  # older firmware answers some of these with an error
+        settings[key] = value if value is None or isinstance(value, (int, dict)) else str(value)
+    return settings
+
+
+def read_device(conn):
+    """(settings, [user records]) with templates nested per user."""
+    settings = read_settings(conn)
+    users = conn.get_users()
+    fingers = {}
+    for f in conn.get_templates():
+        fingers.setdefault(f.uid, []).append(f)
+    records = sorted((user_record(u, fingers.get(u.uid, ())) for u in users), key=lambda r: r["uid"])
+    return settings, records
+
+
+def write_snapshot(path, device, settings, users):
+    body = {
+        "format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "source": {"name": device.get("name"), "ip": device["ip"], "port": device.get("port", 4370)},
+        "settings": settings,
+        "users": users,
+        "sha256": seal(users),
+    }
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(body, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)  # a half-written snapshot never takes the real name
+
+
+def read_snapshot(path):
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            body = json.load(f)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"{path}: not a snapshot ({e})")
+    if body.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"{path}: not a snapshot")
+    if body.get("version", 0) > SNAPSHOT_VERSION:
+        raise SnapshotError(f"{path}: version {body['version']} is newer than this tool ({SNAPSHOT_VERSION})")
+    if seal(body["users"]) != body.get("sha256"):
+        raise SnapshotError(f"{path}: checksum mismatch, the file is damaged")
+    return body
+
+
+def snapshot_name(device, out_dir="."):
+    label = "".join(c if c.isalnum() else "_" for c in device.get("name") or device["ip"])
+    label = "_".join(p for p in label.split("_") if p)
+    return os.path.join(out_dir, f"{label}_{datetime.now():%Y%m%d-%H%M%S}{SNAPSHOT_EXT}")
+
+
+def describe(body):
+    users = body["users"]
+    fingers = sum(len(u["fingers"]) for u in users)
+    cards = sum(1 for u in users if u["card"])
+    src = body["source"]
+    return (f"{src.get('name') or src['ip']} ({src['ip']}) at {body['created']}: "
+            f"{len(users)} users, {cards} cards, {fingers} templates")
+
+
+# --- Backup ---
+def backup(device, out_dir="."):
+    """Snapshots device into out_dir; returns the file path."""
+    t = Timings()
+    with t.phase("connect"):
+        conn = connect(device)
+    try:
+        with t.phase("read device"):
+            settings, users = read_device(conn)
+    finally:
+        conn.disconnect()
+    path = snapshot_name(device, out_dir)
+    with t.phase("write file"):
+        os.makedirs(out_dir, exist_ok=True)
+        write_snapshot(path, device, settings, users)
+    print(f"✅ {describe(read_snapshot(path))}")
+    print(f"   {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+    t.report()
+    return path
+
+
+# --- Restore ---
+def to_pyzk(rec):
+    user = User(rec["uid"], rec["name"], rec["privilege"], rec["password"], rec["group_id"], rec["user_id"], rec["card"])
+    fingers = [Finger(rec["uid"], fid, valid, base64.b64decode(tpl)) for fid, valid, tpl in rec["fingers"]]
+    return user, fingers
+
+
+def differing(wanted, present):
+    """Records of wanted that the device doesn't hold exactly."""
+    have = {r["uid"]: r for r in present}
+    return [r for r in wanted if have.get(r["uid"]) != r]
+
+
+def stale_fingers(wanted, present):
+    """uids whose device copy has a finger the snapshot doesn't; uploads only add, so these are deleted first."""
+    have = {r["uid"]: {f[0] for f in r["fingers"]} for r in present}
+    return {r["uid"] for r in wanted if have.get(r["uid"], set()) - {f[0] for f in r["fingers"]}}
+
+
+def write_users(conn, device, records, meter, stale=(), label="write"):
+    """Uploads records WRITE_BATCH per lockout; returns the user ids that failed."""
+    bulk = getattr(conn, "HR_save_usertemplates", None)
+    rescue = rescue_for(device)
+    failed = []
+    for i in range(0, len(records), WRITE_BATCH):
+        batch = records[i:i + WRITE_BATCH]
+        try:
+            with meter.lockout(conn, f"{label} users {i + 1}-{i + len(batch)}", rescue) as lk:
+                for rec in batch:
+                    if rec["uid"] in stale:
+                        lk.check()
+                        conn.delete_user(uid=rec["uid"])
+                if bulk:
+                    lk.check()
+                    try:
+                        bulk([list(to_pyzk(r)) for r in batch])
+                        lk.items = len(batch)
+                        continue
+                    except Exception as e:
+                        print(f"Bulk upload failed ({e}); writing users one by one")
+                for rec in batch:
+                    lk.check()
+                    user, fingers = to_pyzk(rec)
+                    try:
+                        if fingers:
+                            conn.save_user_template(user, fingers)
+                        else:
+                            conn.set_user(uid=user.uid, name=user.name, privilege=user.privilege, password=user.password,
+                                          group_id=user.group_id, user_id=user.user_id, card=user.card)
+                    except Exception as e:
+                        print(f"Failed to write {rec['user_id']}: {e}")
+                        failed.append(rec["user_id"])
+        except LockoutExceeded as e:
+            print(f"⚠️ {e}; stopping the restore")
+            failed.extend(r["user_id"] for r in records[i:])
+            break
+    return failed
+
+
+def compare_settings(snapshot, current):
+    """[(key, snapshot value, device value)] worth a look after a swap."""
+    return [(k, snapshot.get(k), current.get(k)) for k in SETTINGS
+            if k not in PER_UNIT and snapshot.get(k) is not None and snapshot.get(k) != current.get(k)]
+
+
+def restore(path, device, prune=False, verify=True, dry_run=False, set_clock=True):
+    """Brings device in line with the snapshot at path; returns True if it verified clean."""
+    t = Timings()
+    with t.phase("read snapshot"):
+        body = read_snapshot(path)
+    wanted = body["users"]
+    print(f"Snapshot: {describe(body)}")
+    with t.phase("connect"):
+        conn = connect(device)
+    meter = LockoutMeter()
+    ok = True
+    try:
+        with t.phase("read device"):
+            settings, present = read_device(conn)
+        todo = differing(wanted, present)
+        keep = {r["uid"] for r in wanted}
+        extra = [r for r in present if r["uid"] not in keep]
+        print(f"Target {device.get('name') or device['ip']}: {len(present)} users, "
+              f"{len(todo)} to write, {len(wanted) - len(todo)} already identical, {len(extra)} not in the snapshot"
+              + (" (will be removed)" if prune and extra else ""))
+        if dry_run:
+            return True
+
+        with t.phase("write users"):
+            failed = write_users(conn, device, todo, meter, stale_fingers(todo, present))
+        if prune and extra:
+            with t.phase("remove extras"):
+                with meter.lockout(conn, f"remove {len(extra)} users", rescue_for(device)) as lk:
+                    for r in extra:
+                        lk.check()
+                        conn.delete_user(uid=r["uid"])
+        if set_clock:
+            with t.phase("set clock"):
+                conn.set_time(datetime.now())
+
+        if verify:
+            with t.phase("verify"):
+                current, present = read_device(conn)
+                todo = differing(wanted, present)
+            if todo:
+                print(f"{len(todo)} user(s) differ after writing; writing them again")
+                with t.phase("repair"):
+                    write_users(conn, device, todo, meter, stale_fingers(todo, present), label="repair")
+                with t.phase("verify again"):
+                    current, present = read_device(conn)
+                    todo = differing(wanted, present)
+            ok = not todo
+            if ok:
+                print(f"✅ Verified: {len(wanted)} users and {sum(len(r['fingers']) for r in wanted)} templates match the snapshot")
+            else:
+                print(f"❌ {len(todo)} user(s) still differ: {', '.join(r['user_id'] for r in todo[:20])}"
+                      + (" ..." if len(todo) > 20 else ""))
+            for key, was, now in compare_settings(body["settings"], current):
+                print(f"⚠️ {key}: snapshot {was!r}, device {now!r} (set it on the device)")
+        else:
+            ok = not failed
+    finally:
+        conn.disconnect()
+        meter.report()
+        t.report()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot a device and restore it onto a replacement")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bk = sub.add_parser("backup", help="snapshot a device to a file")
+    bk.add_argument("device", help="name or ip from devices.json")
+    bk.add_argument("--out", default=".", help="output directory")
+    rs = sub.add_parser("restore", help="write a snapshot onto a device")
+    rs.add_argument("file")
+    rs.add_argument("device", help="name or ip from devices.json")
+    rs.add_argument("--prune", action="store_true", help="delete users the snapshot doesn't have")
+    rs.add_argument("--no-verify", action="store_true", help="skip reading everything back")
+    rs.add_argument("--keep-clock", action="store_true", help="don't set the device clock from this PC")
+    rs.add_argument("--dry-run", action="store_true", help="only show what would be written")
+    sh = sub.add_parser("show", help="summarise a snapshot")
+    sh.add_argument("file")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "show":
+            body = read_snapshot(args.file)
+            print(describe(body))
+            for key, value in body["settings"].items():
+                print(f"  {key:<13} {value}")
+            return
+        device = pick_device(load_devices(), args.device)
+        if args.command == "backup":
+            backup(device, args.out)
+        else:
+            restore(args.file, device, prune=args.prune, verify=not args.no_verify,
+                    dry_run=args.dry_run, set_clock=not args.keep_clock)
+    except SnapshotError as e:
+        print(f"❌ {e}")
+    except Exception as e:
+        print(f"❌ {args.command} failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
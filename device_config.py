@@ -0,0 +1,101 @@
+import os
+import json
+import threading
+
+# devices.json loading and live reload. Devices are matched by name between
+# versions of the file, so a re-IP'd terminal shows up as "changed" rather
+# than as one removal plus one addition.
+
+DEVICES_FILE = "devices.json"
+ADDRESS_FIELDS = ("ip", "port")
+
+
+def load_devices(path=DEVICES_FILE):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+        return []
+
+
+def save_devices(devices, path=DEVICES_FILE):
+    """Rewrites devices.json atomically, one device per line like the hand-edited file."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write("[\n" + ",\n".join("    " + json.dumps(d, ensure_ascii=False, separators=(",", ":")) for d in devices) + "\n]\n")
+    os.replace(tmp, path)
+
+
+def device_id(device):
+    return device.get("name") or device.get("ip")
+
+
+def diff_devices(old, new):
+    """Returns (added, removed, changed, updated).
+    changed: [(old, new)] whose address moved -> session must restart
+    updated: [(old, new)] with other edits only (poll settings, ...) -> no restart"""
+    old_map = {device_id(d): d for d in old}
+    new_map = {device_id(d): d for d in new}
+    added = [d for k, d in new_map.items() if k not in old_map]
+    removed = [d for k, d in old_map.items() if k not in new_map]
+    changed, updated = [], []
+    for k in old_map.keys() & new_map.keys():
+        o, n = old_map[k], new_map[k]
+        if o == n:
+            continue
+        if any(o.get(f, 4370 if f == "port" else None) != n.get(f, 4370 if f == "port" else None) for f in ADDRESS_FIELDS):
+            changed.append((o, n))
+        else:
+            updated.append((o, n))
+    return added, removed, changed, updated
+
+
+class DevicesWatcher:
+    """Polls devices.json and calls on_change(devices, diff) when its content changes."""
+
+    def __init__(self, devices, on_change, path=DEVICES_FILE, interval=2.0):
+        self.devices = devices
+        self.on_change = on_change
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.stamp = self._stamp()
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def start(self):
+        threading.Thread(target=self._run, name="devices-watcher", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def check(self):
+        stamp = self._stamp()
+        if stamp == self.stamp:
+            return
+        try:
+            with open(self.path, "r") as f:
+                devices = json.load(f)
+        except Exception as e:
+            # probably caught mid-save; the next check will see the finished file
+            print(f"Ignoring unreadable {self.path}: {e}")
+            return
+        self.stamp = stamp
+        diff = diff_devices(self.devices, devices)
+        self.devices = devices
+        if any(diff):
+            self.on_change(devices, diff)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Device config watcher error: {e}")
@@ -0,0 +1,142 @@
+import os
+import re
+import json
+import time
+import uuid
+import socket
+import threading
+
+# Leases so that several collector instances sharing a data directory (front
+# desk and HR, or a standby PC) never poll the same device twice. Each device
+# has a small lease file; whoever holds an unexpired lease polls it and the
+# other instances read the punches it stores. Holders renew every
+# RENEW_EVERY seconds. When a holder dies, its lease runs out after LEASE_TTL
+# and another instance takes over.
+#
+#   leases/192.168.30.199.lease  {"owner": "FRONTDESK-4120-1a2b3c", "host": "FRONTDESK",
+#                                 "pid": 4120, "expires": 1760860812.4}
+#
+# Expiry uses wall clock time, so machines sharing the directory over the
+# network need roughly synchronized clocks (well within LEASE_TTL).
+
+LEASE_DIR = "leases"
+LEASE_TTL = 10.0
+RENEW_EVERY = 3.0
+SETTLE = 0.2  # after taking over an expired lease, wait this long and re-read to settle races
+
+
+def new_owner_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class LeaseManager:
+    def __init__(self, directory=LEASE_DIR, ttl=LEASE_TTL, owner=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.owner = owner or new_owner_id()
+        self.lock = threading.Lock()
+        self.held = {}  # name -> expiry we last wrote
+        self.stop_event = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", name) + ".lease")
+
+    def read(self, name):
+        try:
+            with open(self.path(name), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            return {}  # being rewritten right now; treat as taken
+
+    def _record(self):
+        return {"owner": self.owner, "host": socket.gethostname(), "pid": os.getpid(), "expires": time.time() + self.ttl}
+
+    def _write(self, name, record, create=False):
+        path = self.path(name)
+        if create:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            with os.fdopen(fd, "w") as f:
+                json.dump(record, f)
+            return
+        tmp = f"{path}.{self.owner}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp, path)
+
+    # --- Public API ---
+    def owner_of(self, name):
+        """The current holder's record, or None if the lease is free or expired."""
+        info = self.read(name)
+        if info is None or (info and info.get("expires", 0) < time.time()):
+            return None
+        return info
+
+    def holds(self, name):
+        with self.lock:
+            return self.held.get(name, 0) > time.time()
+
+    def try_acquire(self, name):
+        """Takes (or renews) the lease if it is free, expired or already ours."""
+        info = self.read(name)
+        record = self._record()
+        try:
+            if info is None:
+                self._write(name, record, create=True)
+            elif info.get("owner") == self.owner or info.get("expires", float("inf")) < time.time():
+                self._write(name, record)
+                if info.get("owner") != self.owner:
+                    time.sleep(SETTLE)
+                    if (self.read(name) or {}).get("owner") != self.owner:
+                        return False  # another instance took it over at the same moment
+            else:
+                return False
+        except FileExistsError:
+            return False
+        except OSError as e:
+            print(f"Lease {name}: {e}")
+            return False
+        with self.lock:
+            self.held[name] = record["expires"]
+        return True
+
+    def renew_all(self):
+        """Renews every held lease; returns the names that were lost to another instance."""
+        with self.lock:
+            names = list(self.held)
+        lost = []
+        for name in names:
+            info = self.read(name)
+            taken = info is None or (info and info.get("owner") != self.owner)
+            if not taken and (self.try_acquire(name) or self.holds(name)):
+                continue  # renewed, or a transient write error with time left on the lease
+            with self.lock:
+                self.held.pop(name, None)
+            lost.append(name)
+        return lost
+
+    def release(self, name):
+        with self.lock:
+            held = self.held.pop(name, None)
+        if held is not None and (self.read(name) or {}).get("owner") == self.owner:
+            try: os.remove(self.path(name))
+            except OSError: pass
+
+    def start(self, on_lost=None, interval=RENEW_EVERY):
+        def run():
+            while not self.stop_event.wait(interval):
+                for name in self.renew_all():
+                    print(f"Lease {name} lost to another instance")
+                    if on_lost: on_lost(name)
+        threading.Thread(target=run, name="lease-keeper", daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stops renewing and hands every lease back so others take over at once."""
+        self.stop_event.set()
+        with self.lock:
+            names = list(self.held)
+        for name in names:
+            self.release(name)
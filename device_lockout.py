@@ -0,0 +1,97 @@
+import time
+import threading
+
+# Keeps terminals usable at the door during bulk jobs. Reads (users,
+# attendance, templates) run with the device enabled; only writes are
+# wrapped in a lockout, kept as short as possible and timed:
+#
+#   meter = LockoutMeter()
+#   with meter.lockout(conn, "write users 1-50", rescue=...) as lk:
+#       for u in batch:
+#           lk.check()          # raises LockoutExceeded past the ceiling
+#           conn.set_user(...)
+#   meter.report()
+#
+# The device is re-enabled on exit no matter what. If the job is stuck inside
+# a pyzk call when the ceiling passes, the watchdog runs rescue() (typically
+# enable_device() over a second connection) so the door never stays locked.
+
+LOCKOUT_CEILING = 30.0  # seconds a device may stay disabled per critical section
+
+
+class LockoutExceeded(Exception):
+    pass
+
+
+class Lockout:
+    def __init__(self, conn, label, ceiling=LOCKOUT_CEILING, rescue=None):
+        self.conn = conn
+        self.label = label
+        self.ceiling = ceiling
+        self.rescue = rescue
+        self.started = None
+        self.duration = None
+        self.items = 0
+        self.expired = threading.Event()
+        self.rescued = False
+        self.watchdog = None
+
+    def __enter__(self):
+        self.conn.disable_device()
+        self.started = time.perf_counter()
+        self.watchdog = threading.Timer(self.ceiling, self._expire)
+        self.watchdog.daemon = True
+        self.watchdog.start()
+        return self
+
+    def _expire(self):
+        self.expired.set()
+        if self.rescue is not None:
+            try:
+                self.rescue()
+                self.rescued = True
+                print(f"⏱️ {self.label}: lockout ceiling of {self.ceiling:g}s hit, device re-enabled by watchdog")
+            except Exception as e:
+                print(f"⏱️ {self.label}: watchdog could not re-enable the device: {e}")
+
+    def check(self):
+        """Call between items; aborts the section once the ceiling has passed."""
+        if self.expired.is_set():
+            raise LockoutExceeded(f"{self.label}: device disabled longer than {self.ceiling:g}s, aborted after {self.items} item(s)")
+        self.items += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        self.watchdog.cancel()
+        try:
+            self.conn.enable_device()
+        except Exception as e:
+            print(f"{self.label}: enable_device failed: {e}")
+        self.duration = time.perf_counter() - self.started
+        return False
+
+
+class LockoutMeter:
+    """Collects how long every lockout kept a device disabled."""
+
+    def __init__(self, ceiling=LOCKOUT_CEILING):
+        self.ceiling = ceiling
+        self.sections = []
+
+    def lockout(self, conn, label, rescue=None):
+        lk = Lockout(conn, label, self.ceiling, rescue)
+        self.sections.append(lk)
+        return lk
+
+    def total(self):
+        return sum(lk.duration or 0.0 for lk in self.sections)
+
+    def report(self):
+        if not self.sections:
+            print("Devices were never disabled.")
+            return
+        print(f"Device lockouts ({len(self.sections)} section(s), ceiling {self.ceiling:g}s):")
+        for lk in self.sections:
+            state = "ABORTED" if lk.expired.is_set() else "ok"
+            print(f"  {lk.label:<32} {lk.duration or 0.0:7.2f}s  {lk.items:>5} item(s)  {state}")
+        longest = max(lk.duration or 0.0 for lk in self.sections)
+        print(f"  total {self.total():.2f}s disabled, longest single lockout {longest:.2f}s")
@@ -0,0 +1,258 @@
+import re
+import time
+from tkinter import ttk, StringVar, Frame, Label, Entry, LEFT, RIGHT
+
+# Device table that stays responsive with hundreds of devices.
+#
+# Rows are keyed by IP (the Treeview item id *is* the IP), so a status update
+# is a dict write, not a walk over every row. Updates only mark the row
+# dirty; dirty rows are repainted at most every RENDER_MS, so a device that
+# reports ten times between repaints costs one Tk call. Each colour has its
+# own tag, configured once, so one device turning red no longer repaints
+# every row.
+#
+# Clicking a heading sorts by that column (click again to reverse). The
+# filter bar narrows the table by text (name or IP), floor, status and lag;
+# filtered-out rows are detached, not deleted, and come back in sort order.
+#
+# Lag is the time since the device's last successful read.
+
+RENDER_MS = 500         # dirty rows are repainted at most this often
+LAG_REFRESH_MS = 5000   # how often the Lag column ticks when nothing else changes
+COLUMNS = ("Name", "IP", "Port", "Floor", "Users", "Punches", "Lag", "Status")
+WIDTHS = {"Name": 220, "IP": 130, "Port": 70, "Floor": 90, "Users": 80, "Punches": 90, "Lag": 70, "Status": 150}
+ALL = "All"
+STATUSES = (ALL, "Connected", "Connecting", "Disconnected", "Retry", "Standby")
+LAG_FILTERS = {"Any lag": None, "Lag > 1 min": 60, "Lag > 5 min": 300, "Lag > 1 h": 3600}
+
+
+def device_floor(device):
+    """The device's "floor" field, else the floor in its name ("Bus (5th Floor)" -> "5th")."""
+    if device.get("floor") is not None:
+        return str(device["floor"])
+    m = re.search(r"(\w+)\s+floor", device.get("name") or "", re.IGNORECASE)
+    return m.group(1) if m else "-"
+
+
+def status_group(status):
+    """'Connected (3s)' -> 'Connected', 'Retry in 5s' -> 'Retry', 'Connecting...' -> 'Connecting'"""
+    return status.split(" ", 1)[0].rstrip(".")
+
+
+def format_lag(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds // 60:.0f}m"
+    return f"{seconds // 3600:.0f}h"
+
+
+def _ip_key(ip):
+    try: return tuple(int(p) for p in ip.split("."))
+    except ValueError: return (ip,)
+
+
+def _count(value):
+    return value if isinstance(value, int) else -1
+
+
+SORT_KEYS = {
+    "Name": lambda r: (r["name"] or "").lower(),
+    "IP": lambda r: _ip_key(r["ip"]),
+    "Port": lambda r: r["port"],
+    "Floor": lambda r: r["floor"],
+    "Users": lambda r: _count(r["users"]),
+    "Punches": lambda r: _count(r["punches"]),
+    "Lag": lambda r: float("inf") if r["last_ok"] is None else -r["last_ok"],
+    "Status": lambda r: r["status"],
+}
+DYNAMIC = {"Users", "Punches", "Lag", "Status"}  # columns whose value changes with updates
+
+
+class FleetTable:
+    """Device table widget. All methods run on the Tk thread."""
+
+    def __init__(self, parent, root, devices=(), height=6):
+        self.root = root
+        self.rows = {}      # ip -> row state
+        self.dirty = set()  # ips whose values changed since the last repaint
+        self.colors = set() # colour tags configured so far
+        self.sort_col, self.sort_desc = None, False
+        self.shown = ()     # attached ips in display order
+
+        bar = Frame(parent)
+        bar.pack(fill="x")
+        self.text_var = StringVar()
+        self.floor_var = StringVar(value=ALL)
+        self.status_var = StringVar(value=ALL)
+        self.lag_var = StringVar(value=next(iter(LAG_FILTERS)))
+        Label(bar, text="Filter:").pack(side=LEFT)
+        Entry(bar, textvariable=self.text_var, width=22).pack(side=LEFT, padx=4)
+        Label(bar, text="Floor:").pack(side=LEFT, padx=(8, 0))
+        self.floor_box = ttk.Combobox(bar, textvariable=self.floor_var, values=(ALL,), width=8, state="readonly")
+        self.floor_box.pack(side=LEFT, padx=4)
+        Label(bar, text="Status:").pack(side=LEFT, padx=(8, 0))
+        ttk.Combobox(bar, textvariable=self.status_var, values=STATUSES, width=12, state="readonly").pack(side=LEFT, padx=4)
+        ttk.Combobox(bar, textvariable=self.lag_var, values=tuple(LAG_FILTERS), width=11, state="readonly").pack(side=LEFT, padx=8)
+        self.count_var = StringVar()
+        Label(bar, textvariable=self.count_var, fg="gray").pack(side=RIGHT)
+        for var in (self.text_var, self.floor_var, self.status_var, self.lag_var):
+            var.trace_add("write", lambda *_: self.layout())
+
+        self.tree = ttk.Treeview(parent, columns=COLUMNS, show="headings", height=height, selectmode="extended")
+        for c in COLUMNS:
+            self.tree.heading(c, text=c, command=lambda c=c: self.sort_by(c))
+            self.tree.column(c, width=WIDTHS[c], anchor="center")
+        self.tree.pack(fill="x", pady=5)
+
+        for d in devices:
+            self.add(d, layout=False)
+        self._update_floors()
+        self.layout()
+        self.root.after(RENDER_MS, self._render)
+        self.root.after(LAG_REFRESH_MS, self._tick_lag)
+
+    # --- Rows ---
+    def add(self, device, layout=True):
+        ip = device["ip"]
+        if ip in self.rows:
+            self.remove(ip, layout=False)
+        row = self.rows[ip] = {"name": device.get("name"), "ip": ip, "port": device.get("port", 4370),
+                               "floor": device_floor(device), "users": "-", "punches": "-",
+                               "status": "Disconnected", "color": "black", "last_ok": None, "lag": "-"}
+        self.tree.insert("", "end", iid=ip, values=self._values(row), tags=(self._color_tag("black"),))
+        self.tree.detach(ip)  # layout() attaches it if it passes the filter
+        if layout:
+            self._update_floors()
+            self.layout()
+
+    def remove(self, ip, layout=True):
+        if self.rows.pop(ip, None) is None:
+            return
+        self.dirty.discard(ip)
+        self.tree.delete(ip)
+        self.shown = tuple(i for i in self.shown if i != ip)
+        if layout:
+            self._update_floors()
+            self.layout()
+
+    def edit(self, device):
+        """Applies devices.json edits (name, port, floor) to a row, keeping its live state."""
+        row = self.rows.get(device["ip"])
+        if row is None:
+            self.add(device)
+            return
+        row.update(name=device.get("name"), port=device.get("port", 4370), floor=device_floor(device))
+        self.dirty.add(device["ip"])
+        self._update_floors()
+        self.layout()
+
+    def update(self, ip, users="-", punches="-", status="Disconnected", color="black"):
+        """Same arguments as the old set_device_row; painted on the next render tick."""
+        row = self.rows.get(ip)
+        if row is None:
+            return
+        row.update(users=users, punches=punches, status=status, color=color)
+        if punches != "-":
+            row["last_ok"] = time.time()
+        self.dirty.add(ip)
+
+    def selected(self):
+        """Row states of the selected devices."""
+        return [self.rows[ip] for ip in self.tree.selection() if ip in self.rows]
+
+    # --- Rendering ---
+    def _values(self, row):
+        return (row["name"], row["ip"], row["port"], row["floor"], row["users"], row["punches"], row["lag"], row["status"])
+
+    def _color_tag(self, color):
+        tag = f"fg_{color}"
+        if color not in self.colors:
+            self.tree.tag_configure(tag, foreground=color)
+            self.colors.add(color)
+        return tag
+
+    def _lag_seconds(self, row, now=None):
+        return None if row["last_ok"] is None else (now or time.time()) - row["last_ok"]
+
+    def flush(self):
+        """Repaints dirty rows, and re-sorts/re-filters only if that could change the layout."""
+        dirty, self.dirty = self.dirty, set()
+        if not dirty:
+            return
+        now = time.time()
+        for ip in dirty:
+            row = self.rows.get(ip)
+            if row is None:
+                continue
+            row["lag"] = format_lag(self._lag_seconds(row, now))
+            self.tree.item(ip, values=self._values(row), tags=(self._color_tag(row["color"]),))
+        if self.sort_col in DYNAMIC or self._filtering_on_state():
+            self.layout()
+
+    def _render(self):
+        try: self.flush()
+        except Exception as e: print(f"Device table render failed: {e}")
+        self.root.after(RENDER_MS, self._render)
+
+    def _tick_lag(self):
+        now = time.time()
+        for ip, row in self.rows.items():
+            if row["last_ok"] is not None and format_lag(now - row["last_ok"]) != row["lag"]:
+                self.dirty.add(ip)
+        self.root.after(LAG_REFRESH_MS, self._tick_lag)
+
+    # --- Sorting / filtering ---
+    def sort_by(self, col):
+        self.sort_desc = not self.sort_desc if self.sort_col == col else False
+        self.sort_col = col
+        for c in COLUMNS:
+            arrow = (" ▼" if self.sort_desc else " ▲") if c == col else ""
+            self.tree.heading(c, text=c + arrow)
+        self.layout()
+
+    def _filtering_on_state(self):
+        return self.status_var.get() != ALL or LAG_FILTERS.get(self.lag_var.get()) is not None
+
+    def _matcher(self):
+        """Predicate for the current filter bar (the Tk variables are read once, not per row)."""
+        text = self.text_var.get().strip().lower()
+        floor, status = self.floor_var.get(), self.status_var.get()
+        min_lag = LAG_FILTERS.get(self.lag_var.get())
+        now = time.time()
+
+        def matches(row):
+            if text and text not in (row["name"] or "").lower() and text not in row["ip"]:
+                return False
+            if floor != ALL and floor != row["floor"]:
+                return False
+            if status != ALL and status != status_group(row["status"]):
+                return False
+            if min_lag is not None:
+                lag = self._lag_seconds(row, now)
+                if lag is not None and lag <= min_lag:
+                    return False  # never read counts as lagging
+            return True
+        return matches
+
+    def layout(self):
+        """Shows matching rows in sort order; moves only when the order actually changed."""
+        matches = self._matcher()
+        rows = [r for r in self.rows.values() if matches(r)]
+        if self.sort_col:
+            rows.sort(key=SORT_KEYS[self.sort_col], reverse=self.sort_desc)
+        shown = tuple(r["ip"] for r in rows)
+        if shown != self.shown:
+            hidden = set(self.shown).difference(shown).intersection(self.rows)
+            if hidden:
+                self.tree.detach(*hidden)
+            for i, ip in enumerate(shown):
+                self.tree.move(ip, "", i)  # also re-attaches rows that were filtered out
+            self.shown = shown
+        self.count_var.set(f"Showing {len(shown)} of {len(self.rows)} devices" if len(shown) < len(self.rows) else f"{len(self.rows)} devices")
+
+    def _update_floors(self):
+        floors = sorted({r["floor"] for r in self.rows.values()})
+        self.floor_box.configure(values=(ALL, *floors))
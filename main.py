@@ -1,17 +1,29 @@
 from zk import ZK, const
-import json
+import sys
+from device_config import load_devices
+from device_lockout import LockoutMeter, LockoutExceeded
+
+WRITE_BATCH = 50  # users written per lockout; the door is usable again between batches
 
 def connect_device(ip, port):
+    # devices stay enabled: reads don't need a lockout, writes take their own
     zk = ZK(ip, port=port, timeout=5)
     try:
         conn = zk.connect()
         print(f"Connected to {ip}")
-        conn.disable_device()  # Disable device temporarily
         return conn
     except Exception as e:
         print(f"Failed to connect to {ip}: {e}")
         return None
 
+def enable_over_new_connection(ip, port):
+    """Watchdog rescue: re-enables a device without touching the connection that is stuck."""
+    def rescue():
+        conn = ZK(ip, port=port, timeout=5).connect()
+        try: conn.enable_device()
+        finally: conn.disconnect()
+    return rescue
+
 def fetch_users(conn):
     users = conn.get_users()
     print(f"Total users: {len(users)}")
@@ -26,38 +38,65 @@ def fetch_attendance(conn):
         print(log.user_id, log.timestamp, log.status)
     return logs
 
-def transfer_users(source_conn, target_conn):
+def transfer_users(source_conn, target_conn, meter, rescue=None):
     users = fetch_users(source_conn)
-    for user in users:
+    # read the target first (unlocked) so the lockouts only cover real changes
+    target_users = target_conn.get_users()
+    existing = {u.user_id: (u.name, u.privilege, u.password, u.group_id) for u in target_users}
+    todo = [u for u in users if existing.get(u.user_id) != (u.name, u.privilege, u.password, u.group_id)]
+    # uid is the device's internal slot: keep the target's slot for users it has, new users get free ones
+    slots = {u.user_id: u.uid for u in target_users}
+    next_uid = max((u.uid for u in target_users), default=0) + 1
+    for u in todo:
+        if u.user_id not in slots:
+            slots[u.user_id] = next_uid
+            next_uid += 1
+    print(f"{len(todo)} of {len(users)} users need writing")
+    for i in range(0, len(todo), WRITE_BATCH):
+        batch = todo[i:i + WRITE_BATCH]
         try:
-            target_conn.set_user(uid=user.user_id, name=user.name, password=user.password, privilege=user.privilege, group_id=user.group_id, user_id=user.user_id)
-            print(f"Transferred user {user.user_id}")
-        except Exception as e:
-            print(f"Failed to transfer {user.user_id}: {e}")
+            with meter.lockout(target_conn, f"write users {i + 1}-{i + len(batch)}", rescue) as lk:
+                for user in batch:
+                    lk.check()
+                    try:
+                        target_conn.set_user(uid=slots[user.user_id], name=user.name, password=user.password, privilege=user.privilege, group_id=user.group_id, user_id=user.user_id)
+                        print(f"Transferred user {user.user_id}")
+                    except Exception as e:
+                        print(f"Failed to transfer {user.user_id}: {e}")
+        except LockoutExceeded as e:
+            print(f"⚠️ {e}; stopping the transfer")
+            break
+
+def pick_device(devices, key):
+    for d in devices:
+        if key in (d.get("name"), d.get("ip")):
+            return d
+    raise SystemExit(f"No device {key!r} in devices.json")
 
 def main():
-    # Load devices
-    with open("devices.json") as f:
-        devices = json.load(f)
+    # Load devices: source and target by name or ip, else the first two in devices.json
+    devices = load_devices()
+    args = sys.argv[1:]
+    source = pick_device(devices, args[0]) if args else (devices[0] if devices else None)
+    target = pick_device(devices, args[1]) if len(args) > 1 else (devices[1] if len(devices) > 1 else None)
 
     # Connect to devices
-    device_a = connect_device(devices["device_a"]["ip"], devices["device_a"]["port"])
-    device_b = connect_device(devices["device_b"]["ip"], devices["device_b"]["port"])
+    device_a = connect_device(source["ip"], source.get("port", 4370)) if source else None
+    device_b = connect_device(target["ip"], target.get("port", 4370)) if target else None
+    meter = LockoutMeter()
 
     if device_a:
         fetch_users(device_a)
         fetch_attendance(device_a)
 
     if device_a and device_b:
-        transfer_users(device_a, device_b)
+        transfer_users(device_a, device_b, meter, enable_over_new_connection(target["ip"], target.get("port", 4370)))
 
-    # Enable devices back
     if device_a:
-        device_a.enable_device()
         device_a.disconnect()
     if device_b:
-        device_b.enable_device()
         device_b.disconnect()
+    meter.report()
 
 if __name__ == "__main__":
     main()
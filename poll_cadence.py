@@ -0,0 +1,62 @@
+from datetime import datetime
+
+# Adaptive polling interval per device.
+#
+# A poll that finds new punches snaps the interval down to the minimum; each
+# idle poll relaxes it by BACKOFF up to the maximum. Bounds can be overridden
+# per time of day, e.g. to keep the entrance terminal tight around shift change:
+#
+#   "poll": {"min": 1, "max": 30,
+#            "profile": [{"from": "08:30", "to": "09:45", "max": 3},
+#                        {"from": "17:30", "to": "18:30", "max": 3}]}
+#
+# in a devices.json entry.
+
+DEFAULT_MIN = 2.0
+DEFAULT_MAX = 30.0
+BACKOFF = 1.5
+
+
+def _minutes(hhmm):
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+
+class AdaptivePoller:
+    def __init__(self, min_interval=DEFAULT_MIN, max_interval=DEFAULT_MAX, profile=None, backoff=BACKOFF):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        # (start minute, end minute, min, max); windows may wrap past midnight
+        self.profile = [
+            (_minutes(p["from"]), _minutes(p["to"]), p.get("min", min_interval), p.get("max", max_interval))
+            for p in (profile or [])
+        ]
+        self.interval = min_interval
+
+    def bounds(self, now=None):
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, lo, hi in self.profile:
+            inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if inside:
+                return lo, hi
+        return self.min_interval, self.max_interval
+
+    def next_interval(self, new_punches, now=None):
+        lo, hi = self.bounds(now)
+        if new_punches:
+            self.interval = lo
+        else:
+            self.interval = self.interval * self.backoff
+        self.interval = max(lo, min(hi, self.interval))
+        return self.interval
+
+    def reset(self):
+        self.interval = self.min_interval
+
+
+def poller_for_device(device):
+    """Builds a poller from a devices.json entry's optional "poll" section."""
+    cfg = device.get("poll", {}) if device else {}
+    return AdaptivePoller(cfg.get("min", DEFAULT_MIN), cfg.get("max", DEFAULT_MAX), cfg.get("profile"))
@@ -0,0 +1,322 @@
+import os
+import json
+import mmap
+import struct
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# Compact on-disk dedup index for processed punches.
+#
+# The snapshot is a sorted array of fixed-size records that is memory-mapped
+# on open, so startup cost does not grow with history. Keys added since the
+# last snapshot are appended to a small text journal and kept in memory until
+# the next compaction.
+#
+# Several processes may share one index (collector instances in the same
+# data directory). They all append to the journal, but only one should
+# compact: set can_compact to a callable that says whether this process may
+# (e.g. whether it holds the "index" lease). The others re-map the snapshot
+# once the compacting process has replaced it.
+#
+# The snapshot is only mapped while lookups run: wrap a batch of them in
+# `with index.reading():` (single lookups map on their own). Windows cannot
+# replace a file another process has mapped, so no process may keep it
+# mapped while idle. A compaction that still collides with a reader is
+# retried after another COMPACT_EVERY keys, not on every add.
+
+SNAPSHOT_FILE = "processed_logs.snap"
+JOURNAL_FILE = "processed_logs.journal"
+LEGACY_FILE = "processed_logs.json"
+
+MAGIC = b"ZKPI"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")     # magic, version, record size, count
+UID_LEN = 24                          # pyzk user_id field width
+RECORD = struct.Struct(f">{UID_LEN}sI")  # big-endian ts so bytes sort == numeric sort
+EPOCH = datetime(2000, 1, 1)
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+COMPACT_EVERY = 5000  # journal keys before folding them into the snapshot
+
+
+def pack_key(key):
+    """'<user_id>_<YYYY-mm-dd HH:MM:SS>' -> fixed-size sortable record"""
+    uid, ts_str = key.rsplit("_", 1)
+    ts = datetime.strptime(ts_str, TS_FORMAT)
+    return RECORD.pack(uid.encode()[:UID_LEN], int((ts - EPOCH).total_seconds()))
+
+
+def unpack_key(rec):
+    uid, secs = RECORD.unpack(rec)
+    uid = uid.rstrip(b"\x00").decode(errors="ignore")
+    return f"{uid}_{(EPOCH + timedelta(seconds=secs)).strftime(TS_FORMAT)}"
+
+
+class PunchIndex:
+    """Set-like view over the snapshot + journal. Thread-safe."""
+
+    def __init__(self, snapshot_file=SNAPSHOT_FILE, journal_file=JOURNAL_FILE):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.lock = threading.Lock()
+        self.recent = set()
+        self.can_compact = lambda: True
+        self._file = None
+        self._map = None
+        self._count = 0
+        self._stamp = None
+        self._readers = 0  # lookup batches in progress (see reading())
+        self._compact_at = COMPACT_EVERY
+        self._remap()
+        self._release()
+        self._load_journal()
+
+    # --- Snapshot ---
+    def _map_snapshot(self):
+        try:
+            f = open(self.snapshot_file, "rb")
+        except FileNotFoundError:
+            return
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            f.close()
+            return
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rec_size, count = HEADER.unpack_from(m, 0)
+        if magic != MAGIC or version != VERSION or rec_size != RECORD.size:
+            print(f"Ignoring incompatible snapshot {self.snapshot_file}")
+            m.close()
+            f.close()
+            return
+        self._file, self._map, self._count = f, m, count
+        self._stamp = self._snapshot_stamp()
+
+    def _snapshot_stamp(self):
+        try:
+            st = os.stat(self.snapshot_file)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _unmap_snapshot(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._file, self._map, self._count = None, None, 0
+
+    def _release(self):
+        """Unmaps the snapshot but remembers its size; the next lookup maps it again."""
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._file, self._map = None, None
+
+    def _remap(self):
+        """Maps the current snapshot; forgets journal keys a newer snapshot now covers."""
+        stamp = self._stamp
+        self._unmap_snapshot()
+        self._map_snapshot()
+        if self._map is None or self._stamp == stamp or not self.recent:
+            return
+        covered = set()
+        for k in self.recent:
+            try:
+                if self._snapshot_contains(pack_key(k)): covered.add(k)
+            except ValueError:
+                pass
+        self.recent -= covered
+
+    @contextmanager
+    def reading(self):
+        """Keeps the snapshot mapped across a batch of lookups, released when the last batch ends."""
+        with self.lock:
+            self._readers += 1
+            if self._map is None:
+                self._remap()
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self._readers -= 1
+                if not self._readers:
+                    self._release()
+
+    def _record(self, i):
+        off = HEADER.size + i * RECORD.size
+        return self._map[off:off + RECORD.size]
+
+    def _snapshot_contains(self, rec):
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = self._record(mid)
+            if cur < rec:
+                lo = mid + 1
+            elif cur > rec:
+                hi = mid
+            else:
+                return True
+        return False
+
+    # --- Journal ---
+    def _merging_file(self):
+        return self.journal_file + ".merging"
+
+    def _read_keys(self, path):
+        try:
+            with open(path, "r") as f:
+                return {line.strip() for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def _load_journal(self):
+        # a .merging journal is left behind by an interrupted compaction
+        self.recent.update(self._read_keys(self._merging_file()))
+        self.recent.update(self._read_keys(self.journal_file))
+
+    # --- Set API ---
+    def __contains__(self, key):
+        if key in self.recent:
+            return True
+        try:
+            rec = pack_key(key)
+        except ValueError:
+            return False
+        with self.reading(), self.lock:
+            if self._map is None:
+                self._remap()  # a compaction swapped it in the middle of the batch
+            return bool(self._count) and self._snapshot_contains(rec)
+
+    def __len__(self):
+        return self._count + len(self.recent)
+
+    def __iter__(self):
+        with self.reading(), self.lock:
+            keys = [unpack_key(self._record(i)) for i in range(self._count)]
+            keys.extend(self.recent)
+        return iter(keys)
+
+    def add(self, key):
+        self.add_many([key])
+
+    def add_many(self, keys):
+        with self.reading():
+            keys = [k for k in keys if k not in self]
+        if not keys:
+            return
+        with self.lock:
+            with open(self.journal_file, "a") as f:
+                f.write("".join(f"{k}\n" for k in keys))
+            self.recent.update(keys)
+            compact = len(self.recent) >= self._compact_at
+        if compact:
+            if self.can_compact():
+                self.compact()
+            else:
+                self.refresh()
+
+    def refresh(self):
+        """Re-maps a snapshot replaced by another process and forgets keys it now covers."""
+        with self.lock:
+            if self._snapshot_stamp() == self._stamp:
+                return
+            self._remap()
+            if not self._readers:
+                self._release()
+
+    def _defer(self, e):
+        """A reader still has the snapshot open (Windows): retry after another COMPACT_EVERY keys."""
+        print(f"Snapshot compaction deferred: {e}")
+        self._compact_at = len(self.recent) + COMPACT_EVERY
+
+    def compact(self):
+        """Merge the journal into a new snapshot and truncate the journal."""
+        with self.lock:
+            merging = self._merging_file()
+            leftover = self._read_keys(merging)  # from a compaction that did not finish
+            # move the journal aside first: other processes keep appending to a fresh one
+            try:
+                os.replace(self.journal_file, merging)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self._defer(e)
+                return
+            keys = self.recent | leftover | self._read_keys(merging)
+            if leftover:
+                with open(merging, "a") as f:
+                    f.write("".join(f"{k}\n" for k in leftover))  # keep them until the snapshot lands
+            if not keys:
+                return
+            new_recs = set()
+            for k in keys:
+                try: new_recs.add(pack_key(k))
+                except ValueError: print(f"Skipping malformed punch key: {k!r}")
+            new_recs = sorted(new_recs)
+            if self._map is None:
+                self._remap()
+            tmp = self.snapshot_file + ".tmp"
+            count = 0
+            with open(tmp, "wb") as out:
+                out.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0))
+                i, j = 0, 0
+                while i < self._count or j < len(new_recs):
+                    old = self._record(i) if i < self._count else None
+                    new = new_recs[j] if j < len(new_recs) else None
+                    if new is None or (old is not None and old <= new):
+                        rec = old
+                        i += 1
+                        if rec == new:
+                            j += 1
+                    else:
+                        rec = new
+                        j += 1
+                    out.write(rec)
+                    count += 1
+                out.seek(0)
+                out.write(HEADER.pack(MAGIC, VERSION, RECORD.size, count))
+            # the old map must be released before replacing the file (Windows)
+            self._unmap_snapshot()
+            try:
+                os.replace(tmp, self.snapshot_file)
+            except OSError as e:
+                # another process still has the snapshot open; keep the journal and retry later
+                self._defer(e)
+                os.remove(tmp)
+            else:
+                # a process that opened the journal just before it was moved aside appends to
+                # .merging after we read it: carry those keys over to the fresh journal
+                late = self._read_keys(merging) - keys
+                if late:
+                    with open(self.journal_file, "a") as f:
+                        f.write("".join(f"{k}\n" for k in late))
+                if os.path.exists(merging):
+                    os.remove(merging)
+                self.recent = late
+                self._compact_at = COMPACT_EVERY
+            self._remap()
+            if not self._readers:
+                self._release()
+
+    def close(self):
+        if self.can_compact():
+            self.compact()
+        with self.lock:
+            self._unmap_snapshot()
+
+
+def open_punch_index(snapshot_file=SNAPSHOT_FILE, journal_file=JOURNAL_FILE, legacy_file=LEGACY_FILE):
+    """Opens the index, migrating a legacy processed_logs.json on first run."""
+    migrate = not os.path.exists(snapshot_file) and os.path.exists(legacy_file)
+    index = PunchIndex(snapshot_file, journal_file)
+    if migrate:
+        try:
+            with open(legacy_file, "r") as f:
+                keys = json.load(f)
+            with index.lock:
+                index.recent.update(keys)
+            index.compact()
+            print(f"Migrated {len(keys)} keys from {legacy_file} to {snapshot_file}")
+        except Exception as e:
+            print(f"Error migrating {legacy_file}: {e}")
+    return index
@@ -0,0 +1,181 @@
+import json
+from datetime import datetime
+from collections import deque, Counter
+
+# Real-time alert rules evaluated on the ingest stream.
+#
+# rules.json (optional; DEFAULT_RULES otherwise):
+#
+#   {"rules": [
+#      {"type": "unknown_user"},
+#      {"type": "after_hours", "from": "07:00", "to": "20:00", "weekdays": [0, 1, 2, 3, 4, 5]},
+#      {"type": "multi_device", "devices": 3, "window": 600, "name": "hopping"},
+#      {"type": "after_hours", "from": "09:00", "to": "18:00", "scope": ["Bus (5th Floor)"]}
+#    ],
+#    "sinks": [{"type": "file", "name": "alerts", "path": "alerts.jsonl"}]}
+#
+# Rules are compiled once into a per-device dispatch table, so a punch only
+# meets the rules that apply to its device. Windowed rules keep small
+# per-user state that is updated incrementally, so a punch costs the same no
+# matter how much history has gone by. "sinks" takes the same entries as
+# sinks.json and receives one JSON object per alert.
+
+RULES_FILE = "rules.json"
+MAX_AGE = 3600  # older punches (device backlog after an outage, first sync) never alert
+DEFAULT_RULES = [
+    {"type": "unknown_user"},
+    {"type": "after_hours", "from": "07:00", "to": "20:00"},
+    {"type": "multi_device", "devices": 3, "window": 600},
+]
+DEFAULT_ALERT_SINKS = [{"type": "file", "name": "alerts", "path": "alerts.jsonl", "batch_size": 1, "flush_interval": 1.0}]
+
+
+def _minutes(hhmm):
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+
+class Rule:
+    """Base rule. check(punch, when) returns an alert message or None.
+    Stateful rules implement step(punch, when, state) -> (state, message)
+    instead, where state belongs to the punch's user."""
+
+    severity = "warning"
+    stateful = False
+
+    def __init__(self, config):
+        self.name = config.get("name", config["type"])
+        self.severity = config.get("severity", self.severity)
+        self.scope = config.get("scope")  # device names; None = every device
+
+    def check(self, punch, when):
+        raise NotImplementedError
+
+
+class UnknownUserRule(Rule):
+    """User id that no connected device has on its roster."""
+
+    severity = "critical"
+
+    def __init__(self, config, known_users):
+        super().__init__(config)
+        self.known = known_users  # shared set, kept current by the engine
+
+    def check(self, punch, when):
+        if punch.get("name") is None and punch["user_id"] not in self.known:
+            return f"unknown user id {punch['user_id']} punched at {punch['device']}"
+        return None
+
+
+class AfterHoursRule(Rule):
+    """Punch outside [from, to) or on a day not in weekdays (Monday = 0)."""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.start = _minutes(config.get("from", "07:00"))
+        self.end = _minutes(config.get("to", "20:00"))
+        self.weekdays = frozenset(config.get("weekdays", range(7)))
+
+    def check(self, punch, when):
+        minute = when.hour * 60 + when.minute
+        inside = self.start <= minute < self.end if self.start <= self.end else (minute >= self.start or minute < self.end)
+        if inside and when.weekday() in self.weekdays:
+            return None
+        return f"after-hours punch by {punch['user_id']} at {punch['device']} ({punch['timestamp']})"
+
+
+class MultiDeviceRule(Rule):
+    """User seen on `devices` or more distinct devices within `window` seconds."""
+
+    stateful = True
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.limit = int(config.get("devices", 3))
+        self.window = float(config.get("window", 600))
+
+    def step(self, punch, when, state):
+        # state: (deque of (ts, device), Counter device -> punches in window, [quiet_until])
+        if state is None:
+            state = (deque(), Counter(), [0.0])
+        seen, counts, quiet = state
+        ts = when.timestamp()
+        seen.append((ts, punch["device"]))
+        counts[punch["device"]] += 1
+        while seen and seen[0][0] < ts - self.window:
+            _, dev = seen.popleft()
+            counts[dev] -= 1
+            if not counts[dev]:
+                del counts[dev]
+        if len(counts) >= self.limit and ts >= quiet[0]:
+            quiet[0] = ts + self.window  # once per window, not once per punch
+            return state, f"user {punch['user_id']} punched on {len(counts)} devices within {self.window:.0f}s: {', '.join(sorted(counts))}"
+        return state, None
+
+
+RULE_TYPES = {"unknown_user": UnknownUserRule, "after_hours": AfterHoursRule, "multi_device": MultiDeviceRule}
+
+
+class RuleEngine:
+    def __init__(self, rules=DEFAULT_RULES, max_age=MAX_AGE):
+        self.max_age = max_age
+        self.known_users = set()
+        self.rules = []
+        for cfg in rules:
+            kind = cfg.get("type")
+            if kind not in RULE_TYPES:
+                print(f"Unknown rule type {kind!r}, skipping")
+                continue
+            self.rules.append(UnknownUserRule(cfg, self.known_users) if kind == "unknown_user" else RULE_TYPES[kind](cfg))
+        self.global_rules = [r for r in self.rules if not r.scope]
+        self.by_device = {}  # device -> global + scoped rules, built once per device name
+        self.state = {}      # (rule, user_id) -> rule state
+        self.evaluated = 0
+        self.fired = 0
+
+    def add_users(self, user_ids):
+        self.known_users.update(str(u) for u in user_ids)
+
+    def rules_for(self, device):
+        rules = self.by_device.get(device)
+        if rules is None:
+            rules = self.by_device[device] = self.global_rules + [r for r in self.rules if r.scope and device in r.scope]
+        return rules
+
+    def evaluate(self, punch, now=None):
+        """Returns the alerts (dicts) this punch raises."""
+        when = datetime.fromisoformat(punch["timestamp"])
+        if ((now or datetime.now()) - when).total_seconds() > self.max_age:
+            return []
+        self.evaluated += 1
+        alerts = []
+        for rule in self.rules_for(punch.get("device")):
+            if rule.stateful:
+                key = (rule, punch["user_id"])
+                self.state[key], message = rule.step(punch, when, self.state.get(key))
+            else:
+                message = rule.check(punch, when)
+            if message:
+                alerts.append({"rule": rule.name, "severity": rule.severity, "message": message,
+                               "user_id": punch["user_id"], "name": punch.get("name"),
+                               "device": punch.get("device"), "timestamp": punch["timestamp"]})
+        self.fired += len(alerts)
+        return alerts
+
+    def evaluate_many(self, punches, now=None):
+        now = now or datetime.now()
+        return [a for p in punches for a in self.evaluate(p, now)]
+
+
+def load_rules(path=RULES_FILE):
+    """Returns (RuleEngine, alert sink configs) from rules.json, or the defaults."""
+    try:
+        with open(path, "r") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = {}
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+        config = {}
+    engine = RuleEngine(config.get("rules", DEFAULT_RULES), config.get("max_age", MAX_AGE))
+    return engine, config.get("sinks", DEFAULT_ALERT_SINKS)
@@ -0,0 +1,178 @@
+import time
+import sqlite3
+import threading
+
+# SQLite-backed punch store. One row per unique (user_id, timestamp) punch;
+# seq is assigned at insert and only ever grows.
+
+STORE_FILE = "punches.db"
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS punches (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    name TEXT,
+    timestamp TEXT NOT NULL,
+    punch INTEGER,
+    status INTEGER,
+    device TEXT,
+    ip TEXT,
+    ingested_at REAL NOT NULL,
+    UNIQUE (user_id, timestamp)
+);
+CREATE INDEX IF NOT EXISTS ix_punches_timestamp ON punches (timestamp);
+CREATE INDEX IF NOT EXISTS ix_punches_device ON punches (device, timestamp);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT NOT NULL,
+    name TEXT,
+    device TEXT NOT NULL,
+    ip TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, device)
+);
+"""
+
+PUNCH_FIELDS = ("user_id", "name", "timestamp", "punch", "status", "device", "ip")
+SORT_COLUMNS = ("seq", "user_id", "name", "timestamp", "punch", "device")
+
+
+def make_punch(log, device_name, ip, user_name=None):
+    """pyzk Attendance -> plain dict that sinks and the store understand"""
+    ts = log.timestamp.strftime(TS_FORMAT)
+    return {
+        "key": f"{log.user_id}_{ts}",
+        "user_id": str(log.user_id),
+        "name": user_name,
+        "timestamp": ts,
+        "punch": log.punch,
+        "status": log.status,
+        "device": device_name,
+        "ip": ip,
+    }
+
+
+def build_filters(user_ids=None, start=None, end=None, device=None):
+    """WHERE clauses + params shared by the GUI cursor and the HTTP API."""
+    where, params = [], []
+    if user_ids:
+        where.append(f"user_id IN ({', '.join('?' * len(user_ids))})")
+        params.extend(user_ids)
+    if start:
+        where.append("timestamp >= ?")
+        params.append(start)
+    if end:
+        where.append("timestamp <= ?")
+        params.append(end)
+    if device:
+        where.append("device = ?")
+        params.append(device)
+    return where, params
+
+
+class PunchStore:
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def add_many(self, punches):
+        """Inserts punches, ignoring ones already stored. Returns rows inserted."""
+        now = time.time()
+        rows = [tuple(p.get(f) for f in PUNCH_FIELDS) + (now,) for p in punches]
+        with self.lock, self.db:
+            before = self.db.total_changes
+            self.db.executemany(
+                f"INSERT OR IGNORE INTO punches ({', '.join(PUNCH_FIELDS)}, ingested_at) "
+                f"VALUES ({', '.join('?' * (len(PUNCH_FIELDS) + 1))})", rows)
+            return self.db.total_changes - before
+
+    def backfill_keys(self, keys):
+        """Imports bare '<user_id>_<timestamp>' keys (history from before the store existed)."""
+        punches = []
+        for k in keys:
+            uid, ts = k.rsplit("_", 1)
+            punches.append({"user_id": uid, "timestamp": ts})
+        return self.add_many(punches)
+
+    def count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM punches").fetchone()[0]
+
+    def save_users(self, device, ip, users):
+        """Replaces the cached roster of one device with {user_id: name}."""
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM users WHERE device = ?", (device,))
+            self.db.executemany("INSERT INTO users (user_id, name, device, ip, updated_at) VALUES (?, ?, ?, ?, ?)",
+                                [(str(uid), name, device, ip, now) for uid, name in users.items()])
+
+    def query(self, **filters):
+        return PunchQuery(self, **filters)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class PunchQuery:
+    """Filtered, sorted view over the store, read one page at a time.
+
+    Pages are fetched with keyset pagination on (sort column, seq), so
+    reading page N costs the same as reading page 1."""
+
+    def __init__(self, store, user_ids=None, start=None, end=None, device=None,
+                 order_by="timestamp", descending=False, page_size=200):
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {order_by!r}")
+        self.store = store
+        self.order_by = order_by
+        self.descending = descending
+        self.page_size = page_size
+        self.where, self.params = build_filters(user_ids, start, end, device)
+        self.last = None  # (sort value, seq) of the last row handed out
+        self.exhausted = False
+        self.elapsed = 0.0  # seconds spent in SQLite for this query so far
+
+    def _run(self, sql, params):
+        t0 = time.perf_counter()
+        with self.store.lock:
+            rows = self.store.db.execute(sql, params).fetchall()
+        self.elapsed += time.perf_counter() - t0
+        return rows
+
+    def count(self):
+        sql = "SELECT COUNT(*) FROM punches" + (" WHERE " + " AND ".join(self.where) if self.where else "")
+        return self._run(sql, self.params)[0][0]
+
+    def next_page(self):
+        """Returns the next page of rows (sqlite3.Row), or [] once exhausted."""
+        if self.exhausted:
+            return []
+        col, op, direction = self.order_by, ("<" if self.descending else ">"), ("DESC" if self.descending else "ASC")
+        where, params = list(self.where), list(self.params)
+        if self.last is not None:
+            value, seq = self.last
+            if col == "seq":
+                where.append(f"seq {op} ?")
+                params.append(seq)
+            elif value is None:
+                # NULLs sort first ascending / last descending
+                where.append(f"(({col} IS NULL AND seq {op} ?) OR {col} IS NOT NULL)" if not self.descending
+                             else f"({col} IS NULL AND seq {op} ?)")
+                params.append(seq)
+            else:
+                where.append(f"({col} {op} ? OR ({col} = ? AND seq {op} ?)" + (f" OR {col} IS NULL)" if self.descending else ")"))
+                params.extend([value, value, seq])
+        sql = ("SELECT * FROM punches" + (" WHERE " + " AND ".join(where) if where else "")
+               + f" ORDER BY {col} {direction}" + (f", seq {direction}" if col != "seq" else "") + " LIMIT ?")
+        rows = self._run(sql, params + [self.page_size])
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        if rows:
+            self.last = (rows[-1][col], rows[-1]["seq"])
+        return rows
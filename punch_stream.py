@@ -0,0 +1,151 @@
+import os
+import time
+import base64
+import sqlite3
+import asyncio
+import threading
+from punch_store import STORE_FILE
+
+# Resumable stream of punches out of the store, for anything downstream.
+#
+# The store numbers every punch at ingest (seq only ever grows), so "what's
+# new" is simply "seq after the last one I handled", whatever the device did
+# to its own log in the meantime (cleared, reordered, replaced unit):
+#
+#   stream = PunchStream(cursor_file="payroll.cursor")
+#   for punch in stream:          # follows the store forever
+#       handle(punch)             # dict of the punch columns, plus "cursor"
+#
+#   async for punch in PunchStream(cursor=saved):
+#       await handle(punch)
+#
+# A cursor is an opaque string; keep it and hand it back to resume right
+# after that punch. With a cursor_file the stream resumes from the saved
+# cursor (cursor= only says where a first run starts) and the iterators keep
+# it up to date: a punch counts as handled once the loop asks for the next
+# one, and the position is written after each batch and before waiting for
+# more, so a crash replays at most the punches since the last save and never
+# skips one.
+#
+# The stream reads over its own read-only connection and never blocks the
+# collector writing to the store.
+
+BATCH = 500
+POLL_SECONDS = 1.0
+CURSOR_PREFIX = "ps1:"
+START = None      # cursor=START reads the whole store from the first punch
+LATEST = "latest" # cursor=LATEST skips history and starts with new punches
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(seq):
+    return base64.urlsafe_b64encode(f"{CURSOR_PREFIX}{int(seq)}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        if raw.startswith(CURSOR_PREFIX):
+            return int(raw[len(CURSOR_PREFIX):])
+    except (ValueError, UnicodeDecodeError):
+        pass
+    raise CursorError(f"not a punch stream cursor: {cursor!r}")
+
+
+class CursorFile:
+    """One cursor in a small text file, replaced atomically on save."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, default=START):
+        try:
+            with open(self.path, "r", encoding="ascii") as f:
+                return f.read().strip() or default
+        except FileNotFoundError:
+            return default
+
+    def save(self, cursor):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="ascii") as f:
+            f.write(cursor + "\n")
+        os.replace(tmp, self.path)
+
+
+class PunchStream:
+    def __init__(self, db=STORE_FILE, cursor=START, cursor_file=None, batch=BATCH, poll=POLL_SECONDS):
+        self.file = CursorFile(cursor_file) if cursor_file else None
+        if self.file:
+            cursor = self.file.load(cursor)  # a saved position wins; cursor is where a first run starts
+        self.batch = batch
+        self.poll = poll
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(f"file:{db}?mode=ro", uri=True, check_same_thread=False, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        top = self._top()
+        if cursor == LATEST:
+            self.seq = top
+        else:
+            self.seq = 0 if cursor is START else decode_cursor(cursor)
+            if self.seq > top:
+                # seq never goes back, so this cursor belongs to another (or a rebuilt) store
+                raise CursorError(f"cursor is at punch {self.seq} but {db} has only ever stored {top}")
+        self.saved = self.seq
+
+    def _top(self):
+        """Highest seq ever handed out, deleted rows included."""
+        with self.lock:
+            row = self.db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'punches'").fetchone()
+        return row[0] if row else 0
+
+    @property
+    def cursor(self):
+        return encode_cursor(self.seq)
+
+    def _read(self, after, limit):
+        with self.lock:
+            rows = self.db.execute("SELECT * FROM punches WHERE seq > ? ORDER BY seq LIMIT ?", (after, limit)).fetchall()
+        return [{**dict(r), "cursor": encode_cursor(r["seq"])} for r in rows]
+
+    def fetch(self, limit=None):
+        """The next punches (up to limit) without waiting; the cursor moves past them."""
+        rows = self._read(self.seq, limit or self.batch)
+        if rows:
+            self.seq = rows[-1]["seq"]
+        return rows
+
+    def commit(self):
+        """Writes the current cursor to the cursor file, if there is one and it moved."""
+        if self.file and self.seq != self.saved:
+            self.file.save(self.cursor)
+            self.saved = self.seq
+
+    def __iter__(self):
+        while True:
+            rows = self._read(self.seq, self.batch)
+            for r in rows:
+                yield r
+                self.seq = r["seq"]  # the loop came back for more: r was handled
+            self.commit()
+            if len(rows) < self.batch:
+                time.sleep(self.poll)
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            rows = await loop.run_in_executor(None, self._read, self.seq, self.batch)
+            for r in rows:
+                yield r
+                self.seq = r["seq"]
+            if self.file and self.seq != self.saved:
+                await loop.run_in_executor(None, self.commit)
+            if len(rows) < self.batch:
+                await asyncio.sleep(self.poll)
+
+    def close(self):
+        self.commit()
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,240 @@
+import json
+import base64
+import sqlite3
+import hashlib
+import argparse
+import threading
+from contextlib import closing
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from punch_store import STORE_FILE, build_filters
+
+# Read-only HTTP/JSON API over the punch store, meant to run next to the
+# collector so other teams never need a copy of the data files.
+#
+#   GET /punches?user_id=12&user_id=40&device=Main&from=2026-10-01&to=2026-10-31 23:59:59&limit=500&cursor=...
+#   GET /summary/daily?from=2026-10-01&to=2026-10-31&user_id=12
+#   GET /users?prefix=Ra
+#   GET /health
+#
+# /punches pages by seq (keyset): pass back "next" as cursor= until it is null.
+# Every response carries an ETag; repeat it in If-None-Match to get a 304.
+# Bodies are streamed with chunked encoding straight off the SQLite cursor.
+
+API_HOST = "127.0.0.1"
+API_PORT = 8787
+MAX_LIMIT = 5000
+STREAM_ROWS = 500  # rows fetched from SQLite per chunk
+
+
+def encode_cursor(seq):
+    return base64.urlsafe_b64encode(json.dumps({"seq": seq}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded))
+    seq = data.get("seq") if isinstance(data, dict) else None
+    if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+        raise ValueError(f"bad cursor {cursor!r}")
+    return seq
+
+
+class BadRequest(Exception):
+    pass
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "zk-query-api/1"
+    store_path = STORE_FILE
+
+    # --- Plumbing ---
+    def log_message(self, fmt, *args):
+        pass  # keep the collector console quiet
+
+    def open_db(self):
+        db = sqlite3.connect(f"file:{self.store_path}?mode=ro", uri=True, timeout=10)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def send_json_error(self, code, message):
+        body = json.dumps({"error": message}).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_modified(self, etag):
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return True
+        return False
+
+    def start_stream(self, etag):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+    def write_chunk(self, text):
+        data = text.encode("utf-8")
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+    def end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+
+    def make_etag(self, *parts):
+        return '"' + hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:20] + '"'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        routes = {
+            "/punches": self.get_punches,
+            "/summary/daily": self.get_daily_summary,
+            "/users": self.get_users,
+            "/health": self.get_health,
+        }
+        handler = routes.get(url.path.rstrip("/") or "/")
+        if handler is None:
+            return self.send_json_error(404, f"No route {url.path}")
+        try:
+            with closing(self.open_db()) as db:
+                handler(db, params)
+        except BadRequest as e:
+            self.send_json_error(400, str(e))
+        except sqlite3.OperationalError as e:
+            self.send_json_error(503, f"Punch store unavailable: {e}")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    @staticmethod
+    def one(params, name, default=None):
+        return params.get(name, [default])[0]
+
+    def filters(self, params):
+        end = self.one(params, "to")
+        if end and len(end) == 10:
+            end += " 23:59:59"  # a bare date means the whole day
+        return build_filters(params.get("user_id"), self.one(params, "from"), end, self.one(params, "device"))
+
+    # --- Routes ---
+    def get_health(self, db, params):
+        max_seq = db.execute("SELECT MAX(seq) FROM punches").fetchone()[0]
+        self.start_stream(self.make_etag("health", max_seq))
+        self.write_chunk(json.dumps({"status": "ok", "max_seq": max_seq}))
+        self.end_stream()
+
+    def get_punches(self, db, params):
+        try:
+            limit = min(MAX_LIMIT, int(self.one(params, "limit", 500)))
+            if limit < 1:
+                raise ValueError("limit must be at least 1")
+            after = decode_cursor(self.one(params, "cursor")) if self.one(params, "cursor") else 0
+        except (ValueError, KeyError, json.JSONDecodeError):
+            raise BadRequest("bad limit or cursor")
+        where, args = self.filters(params)
+        where.append("seq > ?")
+        args.append(after)
+        # punches are append-only, so the newest seq pins the answer to this query
+        max_seq = db.execute("SELECT MAX(seq) FROM punches").fetchone()[0]
+        etag = self.make_etag("punches", sorted(params.items()), max_seq)
+        if self.not_modified(etag):
+            return
+        cur = db.execute("SELECT seq, user_id, name, timestamp, punch, status, device, ip FROM punches WHERE "
+                         + " AND ".join(where) + " ORDER BY seq LIMIT ?", args + [limit])
+        self.start_stream(etag)
+        self.write_chunk('{"punches": [')
+        n, last_seq, first = 0, None, True
+        while True:
+            rows = cur.fetchmany(STREAM_ROWS)
+            if not rows:
+                break
+            parts = []
+            for r in rows:
+                parts.append(("" if first else ",") + json.dumps(dict(r), ensure_ascii=False))
+                first = False
+            self.write_chunk("".join(parts))
+            n += len(rows)
+            last_seq = rows[-1]["seq"]
+        nxt = encode_cursor(last_seq) if n == limit else None
+        self.write_chunk(f'], "count": {n}, "next": {json.dumps(nxt)}}}')
+        self.end_stream()
+
+    def get_daily_summary(self, db, params):
+        where, args = self.filters(params)
+        max_seq = db.execute("SELECT MAX(seq) FROM punches").fetchone()[0]
+        etag = self.make_etag("daily", sorted(params.items()), max_seq)
+        if self.not_modified(etag):
+            return
+        sql = ("SELECT user_id, MAX(name) AS name, substr(timestamp, 1, 10) AS day, COUNT(*) AS punches, "
+               "MIN(timestamp) AS first_punch, MAX(timestamp) AS last_punch FROM punches"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + " GROUP BY user_id, day ORDER BY day, user_id")
+        cur = db.execute(sql, args)
+        self.start_stream(etag)
+        self.write_chunk('{"days": [')
+        first = True
+        while True:
+            rows = cur.fetchmany(STREAM_ROWS)
+            if not rows:
+                break
+            self.write_chunk(("" if first else ",") + ",".join(json.dumps(dict(r), ensure_ascii=False) for r in rows))
+            first = False
+        self.write_chunk("]}")
+        self.end_stream()
+
+    def get_users(self, db, params):
+        stamp = db.execute("SELECT COUNT(*), MAX(updated_at) FROM users").fetchone()
+        etag = self.make_etag("users", sorted(params.items()), tuple(stamp))
+        if self.not_modified(etag):
+            return
+        prefix = self.one(params, "prefix")
+        sql = "SELECT user_id, name, device, ip FROM users"
+        args = []
+        if prefix:
+            sql += " WHERE user_id LIKE ? ESCAPE '\\' OR name LIKE ? ESCAPE '\\'"
+            like = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            args = [like, like]
+        users = {}
+        for r in db.execute(sql + " ORDER BY user_id", args):
+            u = users.setdefault(r["user_id"], {"user_id": r["user_id"], "name": r["name"], "devices": []})
+            u["devices"].append(r["device"])
+        self.start_stream(etag)
+        self.write_chunk(json.dumps({"users": list(users.values())}, ensure_ascii=False))
+        self.end_stream()
+
+
+def start_api(host=API_HOST, port=API_PORT, store_path=STORE_FILE):
+    """Starts the API on a daemon thread and returns the server."""
+    handler = type("Handler", (QueryHandler,), {"store_path": store_path})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="query-api", daemon=True).start()
+    print(f"Query API listening on http://{host}:{port}")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read-only HTTP API over the punch store")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--store", default=STORE_FILE)
+    args = parser.parse_args()
+    server = start_api(args.host, args.port, args.store)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
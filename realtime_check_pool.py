@@ -1,35 +1,59 @@
 import time
 from zk import ZK, const
 from zk.exception import ZKNetworkError
+from poll_cadence import AdaptivePoller
+from punch_store import PunchStore, make_punch
+from punch_stream import PunchStream, LATEST
 
 device_ip = '192.168.30.199'
+CURSOR_FILE = 'realtime_check_pool.cursor'
 
 zk = ZK(device_ip, port=4370, timeout=5)
 conn = None
 
+# Device logs go into the punch store (which drops punches it already has);
+# new punches are whatever the store numbered after our saved cursor, so a
+# cleared or reordered device log can't hide or repeat any, and a restart
+# carries on where the last run stopped. Only logs that weren't in the
+# previous read are written, so a poll costs a write for new punches only.
+store = PunchStore()
+stream = PunchStream(store.path, cursor=LATEST, cursor_file=CURSOR_FILE)
+
 try:
     print(f"Connecting to device {device_ip} ...")
     conn = zk.connect()
     print("Connected successfully.")
 
-    last_count = 0
+    poller = AdaptivePoller()
+    stored = set()  # keys of the device log as last written; the first read writes it all once
     while True:
+        new_logs = []
         try:
             logs = conn.get_attendance()
-            if len(logs) > last_count:
-                new_logs = logs[last_count:]
-                for log in new_logs:
-                    print(f"New punch by {log.user_id} at {log.timestamp}")
-                last_count = len(logs)
+            punches = [make_punch(log, device_ip, device_ip) for log in logs]
+            fresh = [p for p in punches if p["key"] not in stored]
+            if fresh:
+                store.add_many(fresh)
+            stored = {p["key"] for p in punches}  # follows the device log, so a cleared log shrinks it
+            rows = stream.fetch()
+            while rows:
+                for p in rows:
+                    if p["ip"] == device_ip:
+                        new_logs.append(p)
+                        print(f"New punch by {p['user_id']} at {p['timestamp']}")
+                rows = stream.fetch()
+            stream.commit()
         except ZKNetworkError as e:
             print("⚠️ Connection lost:", e)
             break
 
-        time.sleep(5)
+        time.sleep(poller.next_interval(len(new_logs)))
 
 except Exception as e:
     print("Error:", e)
 finally:
+    stream.close()
+    store.close()
     if conn:
         try:
             conn.disconnect()
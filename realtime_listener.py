@@ -2,6 +2,8 @@ import time
 from datetime import datetime
 from zk import ZK, const
 from zk.exception import ZKNetworkError
+from reconnect import ReconnectScheduler
+from poll_cadence import AdaptivePoller
 
 DEVICE_IP = '192.168.30.199'
 PORT = 4370
@@ -19,15 +21,19 @@ def main():
     print("🔄 Starting ZK F18 Realtime Monitor...")
     last_logs = set()
     conn = None
+    reconnects = ReconnectScheduler()
+    poller = AdaptivePoller()
 
     while True:
         try:
             if not conn:
                 print(f"⚙️ Connecting to device {DEVICE_IP} ...")
                 conn = connect_device()
+                reconnects.on_connected(DEVICE_IP)
                 print("✅ Connected successfully.")
 
             logs = conn.get_attendance()
+            new_entries = []
             if logs:
                 new_entries = [log for log in logs if get_log_key(log) not in last_logs]
 
@@ -37,26 +43,25 @@ def main():
                     print(f"📢 New Punch Detected: User {log.user_id} at {log.timestamp}")
                     print("📢 Full log:", vars(log))
 
-            time.sleep(3)  # check every 3 seconds
+            time.sleep(poller.next_interval(len(new_entries)))
+            continue
 
         except ZKNetworkError as e:
             print(f"⚠️ Connection error: {e}")
-            print("🔁 Reconnecting in 5 seconds...")
-            time.sleep(5)
-            conn = None
 
         except Exception as e:
             print(f"❌ Unexpected error: {e}")
+
+        # only reached after a failure: drop the connection and back off
+        if conn:
+            try:
+                conn.disconnect()
+            except:
+                pass
             conn = None
-            time.sleep(5)
-
-        finally:
-            if conn:
-                try:
-                    conn.disconnect()
-                except:
-                    pass
-                conn = None
+        delay = reconnects.on_failure(DEVICE_IP)
+        print(f"🔁 Reconnecting in {delay:.1f} seconds...")
+        time.sleep(delay)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,62 @@
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+# Fleet-wide reconnect policy shared by every device listener.
+#
+# - exponential backoff per device with jitter, so devices that dropped
+#   together do not come back in lockstep
+# - a global cap on connects in flight to avoid a reconnect storm after an outage
+# - fast path: a device that had been connected and healthy for a while gets
+#   its first retry almost immediately, then falls back to backoff
+
+
+class ReconnectScheduler:
+    def __init__(self, base_delay=2.0, max_delay=120.0, max_concurrent=4,
+                 healthy_after=30.0, fast_retry=1.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.healthy_after = healthy_after  # seconds connected before a device counts as healthy
+        self.fast_retry = fast_retry        # upper bound of the jittered fast-path delay
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.lock = threading.Lock()
+        self.failures = {}
+        self.connected_since = {}
+
+    @contextmanager
+    def connect_slot(self):
+        """Holds one of the global connect slots for the duration of a connect attempt."""
+        with self.slots:
+            yield
+
+    def on_connected(self, key):
+        with self.lock:
+            self.connected_since[key] = time.time()
+
+    def on_failure(self, key):
+        """Records a failure and returns how long to wait before reconnecting."""
+        now = time.time()
+        with self.lock:
+            since = self.connected_since.pop(key, None)
+            if since is not None and now - since >= self.healthy_after:
+                self.failures[key] = 0
+                return random.uniform(0, self.fast_retry)
+            n = self.failures.get(key, 0)
+            self.failures[key] = n + 1
+        delay = min(self.max_delay, self.base_delay * 2 ** min(n, 32))  # 2 ** n overflows a float after ~1000 failures
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reset(self, key):
+        with self.lock:
+            self.failures.pop(key, None)
+            self.connected_since.pop(key, None)
+
+    def wait(self, delay, should_stop=lambda: False, step=0.25):
+        """Sleeps for delay seconds; returns early (True) once should_stop() is true."""
+        deadline = time.time() + delay
+        while time.time() < deadline:
+            if should_stop():
+                return True
+            time.sleep(min(step, max(0, deadline - time.time())))
+        return should_stop()
@@ -0,0 +1,385 @@
+import json
+import time
+import zlib
+import socket
+import sqlite3
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from punch_store import STORE_FILE, PUNCH_FIELDS, PunchStore
+
+# Edge-to-central replication of the punch store.
+#
+# Every site keeps collecting into its own punches.db. A Replicator ships
+# the rows stored after the last sequence number the central store
+# acknowledged, BATCH_ROWS at a time, as zlib-compressed JSON lines. The
+# local store is the backlog: while the central store is unreachable,
+# nothing is buffered in memory and shipping resumes from the last ack, so
+# traffic grows with new punches, not with history.
+#
+# Central stores are ordinary punch stores with one extra table that keeps,
+# per origin, the highest origin seq applied. A batch and its ack are written
+# in one transaction, and a resent batch only re-inserts rows the unique
+# (user_id, timestamp) key already ignores, so retries are idempotent.
+#
+# replication.json (optional; no replication without it):
+#
+#   {"origin": "dhaka-hq", "central": "http://10.0.0.5:8788"}      # HTTP
+#   {"origin": "dhaka-hq", "central_store": "//server/zk/central.db"}  # a store file
+#
+#   python replication.py serve --store central.db --port 8788     # the central side
+#   python replication.py push --central-store central.db --once   # ship by hand
+
+REPLICATION_FILE = "replication.json"
+CENTRAL_PORT = 8788
+BATCH_ROWS = 2000
+SHIP_INTERVAL = 5.0    # seconds between passes once caught up
+RETRY_MIN = 2.0
+RETRY_MAX = 300.0
+ROW_FIELDS = ("seq",) + PUNCH_FIELDS
+
+ORIGINS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS replication_origins (
+    origin TEXT PRIMARY KEY,
+    acked_seq INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class ReplicationConflict(Exception):
+    """The central store is behind what this edge thinks it acknowledged."""
+
+    def __init__(self, position):
+        super().__init__(f"central store is at seq {position}")
+        self.position = position
+
+
+def encode_batch(rows):
+    return zlib.compress("".join(json.dumps(dict(zip(ROW_FIELDS, r)), ensure_ascii=False) + "\n" for r in rows).encode("utf-8"))
+
+
+def decode_batch(payload):
+    return [json.loads(line) for line in zlib.decompress(payload).decode("utf-8").splitlines() if line]
+
+
+# --- Central side ---
+class CentralStore(PunchStore):
+    """Punch store that applies batches from edge sites."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.db.executescript(ORIGINS_SCHEMA)
+
+    def position(self, origin):
+        with self.lock:
+            row = self.db.execute("SELECT acked_seq FROM replication_origins WHERE origin = ?", (origin,)).fetchone()
+        return row[0] if row else 0
+
+    def apply(self, origin, after, last, payload):
+        """Applies rows (after, last] from origin; returns the origin's new position."""
+        punches = decode_batch(payload)
+        now = time.time()
+        with self.lock, self.db:
+            row = self.db.execute("SELECT acked_seq FROM replication_origins WHERE origin = ?", (origin,)).fetchone()
+            position = row[0] if row else 0
+            if after > position:
+                raise ReplicationConflict(position)
+            if last <= position:
+                return position  # a retry of something already applied
+            self.db.executemany(
+                f"INSERT OR IGNORE INTO punches ({', '.join(PUNCH_FIELDS)}, ingested_at) "
+                f"VALUES ({', '.join('?' * (len(PUNCH_FIELDS) + 1))})",
+                [tuple(p.get(f) for f in PUNCH_FIELDS) + (now,) for p in punches if p["seq"] > position])
+            self.db.execute("INSERT INTO replication_origins (origin, acked_seq, updated_at) VALUES (?, ?, ?) "
+                            "ON CONFLICT(origin) DO UPDATE SET acked_seq = excluded.acked_seq, updated_at = excluded.updated_at",
+                            (origin, last, now))
+        return last
+
+
+class CentralHandler(BaseHTTPRequestHandler):
+    """POST /replicate (headers X-Origin, X-After-Seq, X-Last-Seq; zlib body) and GET /replicate?origin=."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "zk-central/1"
+    store = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_json(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        origin = parse_qs(url.query).get("origin", [None])[0]
+        if url.path.rstrip("/") != "/replicate" or not origin:
+            return self.send_json(404, {"error": "GET /replicate?origin=<origin>"})
+        self.send_json(200, {"origin": origin, "position": self.store.position(origin)})
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/replicate":
+            return self.send_json(404, {"error": f"No route {self.path}"})
+        try:
+            origin = self.headers["X-Origin"]
+            after, last = int(self.headers["X-After-Seq"]), int(self.headers["X-Last-Seq"])
+            payload = self.rfile.read(int(self.headers["Content-Length"]))
+            if not origin:
+                raise ValueError("missing X-Origin")
+        except (TypeError, ValueError) as e:
+            return self.send_json(400, {"error": f"Bad replication request: {e}"})
+        try:
+            self.send_json(200, {"position": self.store.apply(origin, after, last, payload)})
+        except ReplicationConflict as e:
+            self.send_json(409, {"error": str(e), "position": e.position})
+        except (zlib.error, ValueError, KeyError) as e:
+            self.send_json(400, {"error": f"Bad batch: {e}"})
+        except sqlite3.OperationalError as e:
+            self.send_json(503, {"error": f"Central store unavailable: {e}"})
+
+
+def start_central(host="0.0.0.0", port=CENTRAL_PORT, store_path="central.db"):
+    """Starts the central endpoint on a daemon thread and returns the server."""
+    handler = type("Handler", (CentralHandler,), {"store": CentralStore(store_path)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="central", daemon=True).start()
+    print(f"Central store {store_path} accepting replication on http://{host}:{port}/replicate")
+    return server
+
+
+# --- Transports (edge -> central) ---
+class LocalStoreTransport:
+    """Central store reachable as a file (same PC, a share, or a test)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.central = None
+
+    def _store(self):
+        if self.central is None:
+            self.central = CentralStore(self.path)
+        return self.central
+
+    def position(self, origin):
+        return self._store().position(origin)
+
+    def send(self, origin, after, last, payload):
+        return self._store().apply(origin, after, last, payload)
+
+    def close(self):
+        if self.central is not None:
+            self.central.close()
+            self.central = None
+
+
+class HttpTransport:
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip("/") + "/replicate"
+        self.timeout = timeout
+
+    def _call(self, request):
+        from urllib.request import urlopen
+        from urllib.error import HTTPError
+        try:
+            with urlopen(request, timeout=self.timeout) as resp:
+                return json.loads(resp.read())
+        except HTTPError as e:
+            try: body = json.loads(e.read() or b"{}")
+            except ValueError: body = {}
+            if e.code == 409:
+                raise ReplicationConflict(body["position"])
+            raise IOError(f"HTTP {e.code} from {self.url}: {body.get('error')}")
+
+    def position(self, origin):
+        from urllib.parse import quote
+        from urllib.request import Request
+        return self._call(Request(f"{self.url}?origin={quote(origin)}"))["position"]
+
+    def send(self, origin, after, last, payload):
+        from urllib.request import Request
+        headers = {"Content-Type": "application/octet-stream", "X-Origin": origin,
+                   "X-After-Seq": str(after), "X-Last-Seq": str(last)}
+        return self._call(Request(self.url, data=payload, headers=headers, method="POST"))["position"]
+
+    def close(self):
+        pass
+
+
+# --- Edge side ---
+class Replicator:
+    """Ships the local store to a transport from a background thread."""
+
+    def __init__(self, transport, origin, store_path=STORE_FILE, batch_rows=BATCH_ROWS, interval=SHIP_INTERVAL):
+        self.transport = transport
+        self.origin = origin
+        self.store_path = store_path
+        self.batch_rows = batch_rows
+        self.interval = interval
+        self.can_ship = lambda: True  # e.g. only the instance holding the "replication" lease
+        self.acked = None      # central position, asked for on the first pass
+        self.local_max = 0
+        self.shipped_rows = 0
+        self.shipped_bytes = 0
+        self.last_error = None
+        self.last_ship = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _read(self, db, after):
+        return db.execute(f"SELECT {', '.join(ROW_FIELDS)} FROM punches WHERE seq > ? ORDER BY seq LIMIT ?",
+                          (after, self.batch_rows)).fetchall()
+
+    def ship_once(self):
+        """Ships everything pending; returns rows shipped. Raises on transport errors."""
+        if self.acked is None:
+            self.acked = self.transport.position(self.origin)
+        db = sqlite3.connect(f"file:{self.store_path}?mode=ro", uri=True, timeout=30)
+        shipped = 0
+        try:
+            self.local_max = db.execute("SELECT MAX(seq) FROM punches").fetchone()[0] or 0
+            if self.acked > self.local_max:
+                # the local store was replaced: its seqs restart below what central has from this origin
+                raise ReplicationConflict(self.acked)
+            while not self.stop_event.is_set():
+                rows = self._read(db, self.acked)
+                if not rows:
+                    break
+                payload = encode_batch(rows)
+                try:
+                    self.acked = self.transport.send(self.origin, self.acked, rows[-1][0], payload)
+                except ReplicationConflict as e:
+                    print(f"Replication: {e}, resending from there")
+                    self.acked = e.position
+                    continue
+                shipped += len(rows)
+                self.shipped_rows += len(rows)
+                self.shipped_bytes += len(payload)
+                self.last_ship = time.time()
+        finally:
+            db.close()
+        return shipped
+
+    def _run(self):
+        delay = RETRY_MIN
+        while not self.stop_event.is_set():
+            wait = self.interval
+            if self.can_ship():
+                try:
+                    self.ship_once()
+                    self.last_error = None
+                    delay = RETRY_MIN
+                except ReplicationConflict as e:
+                    self.last_error = f"{e}, ahead of the local store; give this site a new origin"
+                    wait = RETRY_MAX
+                except Exception as e:
+                    # offline: the local store keeps the backlog, try again later
+                    self.last_error = str(e)
+                    self.acked = None  # re-ask the central position after reconnecting
+                    wait, delay = delay, min(RETRY_MAX, delay * 2)
+            self.stop_event.wait(wait)
+        self.transport.close()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="replicator", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def lag(self):
+        return {"acked": self.acked, "backlog": max(0, self.local_max - (self.acked or 0)),
+                "shipped_rows": self.shipped_rows, "shipped_bytes": self.shipped_bytes,
+                "last_ship": self.last_ship, "last_error": self.last_error}
+
+
+def make_transport(config):
+    if config.get("central_store"):
+        return LocalStoreTransport(config["central_store"])
+    return HttpTransport(config["central"], config.get("timeout", 30))
+
+
+def load_replicator(path=REPLICATION_FILE, store_path=STORE_FILE):
+    """Replicator from replication.json, or None if replication isn't configured."""
+    try:
+        with open(path, "r") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+        return None
+    if not (config.get("central") or config.get("central_store")):
+        print(f"{path}: no \"central\" or \"central_store\", replication off")
+        return None
+    origin = config.get("origin") or socket.gethostname()
+    return Replicator(make_transport(config), origin, store_path,
+                      config.get("batch_rows", BATCH_ROWS), config.get("interval", SHIP_INTERVAL))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replicate punch stores to a central store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="run the central endpoint")
+    serve.add_argument("--store", default="central.db")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=CENTRAL_PORT)
+    push = sub.add_parser("push", help="ship this site's store")
+    push.add_argument("--store", default=STORE_FILE)
+    push.add_argument("--origin", help="site name (default: from replication.json, else the host name)")
+    target = push.add_mutually_exclusive_group()
+    target.add_argument("--central", help="central endpoint URL")
+    target.add_argument("--central-store", help="central store file")
+    push.add_argument("--once", action="store_true", help="ship what is pending and exit")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = start_central(args.host, args.port, args.store)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    if args.central or args.central_store:
+        config = {"central": args.central, "central_store": args.central_store}
+        rep = Replicator(make_transport(config), args.origin or socket.gethostname(), args.store)
+    else:
+        rep = load_replicator(store_path=args.store)
+        if rep is None:
+            print(f"❌ Nothing to push to: pass --central/--central-store or create {REPLICATION_FILE}")
+            return
+        if args.origin:
+            rep.origin = args.origin
+    if args.once:
+        t0 = time.perf_counter()
+        try:
+            n = rep.ship_once()
+        except Exception as e:
+            print(f"❌ {rep.origin}: {e}")
+            return
+        finally:
+            rep.transport.close()
+        print(f"✅ {rep.origin}: shipped {n} punches ({rep.shipped_bytes} bytes) in {time.perf_counter() - t0:.1f}s, central at seq {rep.acked}")
+        return
+    rep.start()
+    try:
+        while True:
+            time.sleep(10)
+            lag = rep.lag()
+            print(f"{rep.origin}: acked {lag['acked']}, backlog {lag['backlog']}" + (f", error: {lag['last_error']}" if lag["last_error"] else ""))
+    except KeyboardInterrupt:
+        rep.stop()
+
+
+if __name__ == "__main__":
+    main()
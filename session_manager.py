@@ -0,0 +1,157 @@
+import queue
+import itertools
+import threading
+from concurrent.futures import Future
+
+# One pyzk connection per device, owned by a single worker thread. Everything
+# that talks to the device (listener polls, UI queries, bulk jobs) submits a
+# callable instead of touching the connection, so commands never interleave
+# on the wire. Lower priority numbers run first: an interactive query queued
+# behind background polls jumps ahead of them.
+
+CONTROL = -1      # open/close
+INTERACTIVE = 0   # someone is waiting on screen
+BACKGROUND = 10   # polling, bulk sync
+
+
+class SessionClosed(Exception):
+    pass
+
+
+class DeviceSession:
+    def __init__(self, ip, port, connect):
+        self.ip = ip
+        self.port = port
+        self.connect = connect
+        self.conn = None
+        self.queue = queue.PriorityQueue()
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.shut_down = False
+        self.thread = threading.Thread(target=self._run, name=f"session-{ip}", daemon=True)
+        self.thread.start()
+
+    # --- Public API (any thread) ---
+    def submit(self, fn, priority=BACKGROUND):
+        """Queues fn(conn) and returns a Future with its result."""
+        fut = Future()
+        with self.lock:
+            if self.shut_down:
+                fut.set_exception(SessionClosed(f"Session to {self.ip} was shut down"))
+            else:
+                self.queue.put((priority, next(self.seq), fn, fut))
+        return fut
+
+    def call(self, fn, priority=BACKGROUND, timeout=None):
+        return self.submit(fn, priority).result(timeout)
+
+    def call_exclusive(self, fn, priority=BACKGROUND, timeout=None):
+        """Runs fn() with this session's connection closed, then reconnects.
+        For work that opens its own connections: many terminals accept only one at a time."""
+        def run(_):
+            self._close(None)
+            try:
+                return fn()
+            finally:
+                try: self._open(None)
+                except Exception as e: print(f"Reconnect to {self.ip} failed: {e}")  # the next call reports it
+        return self.submit(run, priority).result(timeout)
+
+    def open(self, timeout=None):
+        """Connects if not already connected; raises the connect error otherwise."""
+        return self.submit(self._open, CONTROL).result(timeout)
+
+    def close(self):
+        """Disconnects after the command in progress; does not wait."""
+        return self.submit(self._close, CONTROL)
+
+    @property
+    def is_open(self):
+        return self.conn is not None
+
+    # --- Session thread ---
+    def _open(self, _):
+        if self.conn is None:
+            self.conn = self.connect(self.ip, self.port)
+        return self.conn
+
+    def _close(self, _):
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try: conn.disconnect()
+            except Exception: pass
+
+    def _run(self):
+        while True:
+            priority, _, fn, fut = self.queue.get()
+            if fn is None:
+                self._close(None)
+                fut.set_result(None)
+                # fail whatever was still queued so no caller waits forever
+                while not self.queue.empty():
+                    _, _, _, pending = self.queue.get()
+                    if pending.set_running_or_notify_cancel():
+                        pending.set_exception(SessionClosed(f"Session to {self.ip} was shut down"))
+                break
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                if self.conn is None and fn not in (self._open, self._close):
+                    raise SessionClosed(f"No open session to {self.ip}")
+                fut.set_result(fn(self.conn))
+            except BaseException as e:
+                fut.set_exception(e)
+
+    def shutdown(self):
+        fut = Future()
+        with self.lock:
+            if self.shut_down:
+                fut.set_result(None)
+                return fut
+            self.shut_down = True
+            self.queue.put((CONTROL, next(self.seq), None, fut))
+        return fut
+
+
+class SessionManager:
+    """Owns the DeviceSession for every device, keyed by IP."""
+
+    def __init__(self, connect):
+        self.connect = connect
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def session(self, ip, port):
+        with self.lock:
+            s = self.sessions.get(ip)
+            if s is None or s.port != port:
+                if s is not None:
+                    s.shutdown()
+                s = self.sessions[ip] = DeviceSession(ip, port, self.connect)
+            return s
+
+    def get(self, ip):
+        with self.lock:
+            return self.sessions.get(ip)
+
+    def live(self):
+        """Sessions that currently hold an open connection."""
+        with self.lock:
+            return [s for s in self.sessions.values() if s.is_open]
+
+    def close(self, ip):
+        s = self.get(ip)
+        if s is not None:
+            s.close()
+
+    def remove(self, ip):
+        with self.lock:
+            s = self.sessions.pop(ip, None)
+        if s is not None:
+            s.shutdown()
+
+    def shutdown(self):
+        with self.lock:
+            sessions, self.sessions = list(self.sessions.values()), {}
+        for s in sessions:
+            s.shutdown()
@@ -0,0 +1,227 @@
+import sys
+import gzip
+import json
+import time
+import base64
+import select
+import socket
+import argparse
+import threading
+
+# Record and replay raw device sessions.
+#
+# record: a TCP proxy between pyzk and a real terminal that writes every chunk
+#         in both directions, with timings, to a capture file:
+#
+#     python session_replay.py record --device 192.168.30.199:4370 --listen 127.0.0.1:14370 --out main.zkcap
+#
+#   then point a devices.json entry (or any script) at 127.0.0.1:14370 and use
+#   it normally; each TCP connection pyzk opens is captured separately.
+#
+# replay: serves a capture back on a local port. The N-th client connection
+#         gets the N-th recorded connection; device replies are paced like the
+#         original (--speed 1), faster (--speed 20), or not at all (--speed 0).
+#
+#     python session_replay.py replay main.zkcap --listen 127.0.0.1:14370 --speed 10
+#
+# Only TCP sessions are supported (pyzk's default transport).
+
+FORMAT = "zk-capture"
+VERSION = 1
+BUFSIZE = 65536
+
+
+def parse_addr(addr, default_port=4370):
+    host, _, port = addr.partition(":")
+    return host, int(port or default_port)
+
+
+# --- Capture file ---
+class CaptureWriter:
+    def __init__(self, path, device):
+        self.f = gzip.open(path, "wt", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.write({"format": FORMAT, "version": VERSION, "device": f"{device[0]}:{device[1]}", "started": time.time()})
+
+    def write(self, record):
+        with self.lock:
+            self.f.write(json.dumps(record) + "\n")
+            self.f.flush()
+
+    def event(self, conn_id, t, direction, data):
+        self.write({"conn": conn_id, "t": round(t, 6), "dir": direction, "data": base64.b64encode(data).decode()})
+
+    def close(self):
+        with self.lock:
+            self.f.close()
+
+
+def load_capture(path):
+    """Returns (header, [[event, ...] per connection in order])."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != FORMAT or header.get("version") != VERSION:
+            raise ValueError(f"{path} is not a {FORMAT} v{VERSION} file")
+        conns = {}
+        try:
+            for line in f:
+                if not line.strip():
+                    continue
+                ev = json.loads(line)
+                ev["data"] = base64.b64decode(ev["data"])
+                conns.setdefault(ev["conn"], []).append(ev)
+        except (EOFError, json.JSONDecodeError):
+            # recorder was killed or is still running: use everything flushed so far
+            print(f"{path}: capture is truncated, replaying the complete part")
+    return header, [conns[k] for k in sorted(conns)]
+
+
+# --- Record ---
+def proxy_connection(conn_id, client, device, writer):
+    upstream = socket.create_connection(device, timeout=10)
+    upstream.settimeout(None)
+    t0 = time.perf_counter()
+    peers = {client: (upstream, "c2d"), upstream: (client, "d2c")}
+    try:
+        while True:
+            readable, _, _ = select.select(list(peers), [], [], 60)
+            if not readable:
+                continue
+            for sock in readable:
+                data = sock.recv(BUFSIZE)
+                if not data:
+                    return
+                other, direction = peers[sock]
+                writer.event(conn_id, time.perf_counter() - t0, direction, data)
+                other.sendall(data)
+    except OSError as e:
+        print(f"[conn {conn_id}] closed: {e}")
+    finally:
+        for s in (client, upstream):
+            try: s.close()
+            except OSError: pass
+        print(f"[conn {conn_id}] finished after {time.perf_counter() - t0:.1f}s")
+
+
+def record(device, listen, out):
+    writer = CaptureWriter(out, device)
+    server = socket.create_server(listen)
+    print(f"Recording {device[0]}:{device[1]} via {listen[0]}:{listen[1]} -> {out} (Ctrl+C to stop)")
+    conn_id = 0
+    try:
+        while True:
+            client, addr = server.accept()
+            print(f"[conn {conn_id}] client {addr[0]}:{addr[1]}")
+            threading.Thread(target=proxy_connection, args=(conn_id, client, device, writer), daemon=True).start()
+            conn_id += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        writer.close()
+
+
+# --- Replay ---
+def recv_exact(sock, n):
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("client closed the connection")
+        buf += chunk
+    return buf
+
+
+def replay_connection(conn_id, client, events, speed, strict):
+    t_start = time.perf_counter()
+    prev_t = 0.0
+    mismatches = 0
+    try:
+        for ev in events:
+            gap = ev["t"] - prev_t
+            prev_t = ev["t"]
+            if ev["dir"] == "c2d":
+                got = recv_exact(client, len(ev["data"]))
+                if got != ev["data"]:
+                    mismatches += 1
+                    if strict:
+                        raise ValueError(f"client sent unexpected bytes at t={ev['t']:.3f}")
+            else:
+                if speed > 0 and gap > 0:
+                    time.sleep(gap / speed)  # device think time, scaled
+                client.sendall(ev["data"])
+    except (OSError, ConnectionError, ValueError) as e:
+        print(f"[conn {conn_id}] replay stopped: {e}")
+    finally:
+        client.close()
+    took = time.perf_counter() - t_start
+    print(f"[conn {conn_id}] replayed {len(events)} chunks in {took:.2f}s (recorded {prev_t:.2f}s, {mismatches} mismatched requests)")
+
+
+class ReplayServer:
+    """Plays a capture back to local clients; usable from benchmarks as well as the CLI."""
+
+    def __init__(self, path, listen=("127.0.0.1", 0), speed=1.0, strict=False, loop=False):
+        self.header, self.connections = load_capture(path)
+        self.speed = speed
+        self.strict = strict
+        self.loop = loop
+        self.server = socket.create_server(listen)
+        self.address = self.server.getsockname()
+        self.thread = None
+
+    def serve(self):
+        served, workers = 0, []
+        while self.loop or served < len(self.connections):
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                break
+            events = self.connections[served % len(self.connections)]
+            t = threading.Thread(target=replay_connection, args=(served, client, events, self.speed, self.strict), daemon=True)
+            t.start()
+            workers.append(t)
+            served += 1
+        for t in workers:
+            t.join()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve, name="zk-replay", daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay ZK device sessions")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rec = sub.add_parser("record", help="proxy to a real device and capture the traffic")
+    rec.add_argument("--device", required=True, help="ip[:port] of the real terminal")
+    rec.add_argument("--listen", default="127.0.0.1:14370")
+    rec.add_argument("--out", required=True)
+    rep = sub.add_parser("replay", help="serve a capture on a local port")
+    rep.add_argument("capture")
+    rep.add_argument("--listen", default="127.0.0.1:14370")
+    rep.add_argument("--speed", type=float, default=1.0, help="1 = original timing, 0 = no delays")
+    rep.add_argument("--strict", action="store_true", help="stop when the client deviates from the recording")
+    rep.add_argument("--loop", action="store_true", help="keep serving the capture to new clients")
+    args = parser.parse_args()
+
+    if args.cmd == "record":
+        record(parse_addr(args.device), parse_addr(args.listen), args.out)
+        return
+    server = ReplayServer(args.capture, parse_addr(args.listen), args.speed, args.strict, args.loop)
+    print(f"Replaying {args.capture} ({server.header['device']}, {len(server.connections)} connections) "
+          f"on {server.address[0]}:{server.address[1]} at {args.speed}x")
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
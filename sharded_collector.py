@@ -0,0 +1,248 @@
+import time
+import zlib
+import queue
+import argparse
+import threading
+import multiprocessing as mp
+from device_config import load_devices, device_id, DevicesWatcher
+from transport_tuning import transport_settings
+
+# Headless collector for large fleets. Devices from devices.json are split
+# across worker processes so pyzk decoding is not serialized on one GIL; the
+# coordinator (this process) owns the dedup index and the sinks, and merges
+# every worker's punch stream into them.
+#
+#   python sharded_collector.py --workers 4 --assign hash
+#
+# With --assign static, a device's "worker" field in devices.json pins it to a
+# worker index (devices without one fall back to hashing). When a worker dies
+# its devices are handed to the surviving workers with the fewest devices.
+
+MERGE_BATCH = 1000
+STATS_EVERY = 30
+
+
+def connect_device(ip, port, timeout=10, force_udp=False):
+    from zk import ZK
+    zk = ZK(ip, port=port, timeout=timeout, force_udp=force_udp)
+    return zk.connect()
+
+
+def assign_devices(devices, worker_ids, mode="hash"):
+    """Returns {worker_id: [device, ...]}."""
+    plan = {w: [] for w in worker_ids}
+    for d in devices:
+        w = d.get("worker") if mode == "static" else None
+        if w not in plan:
+            w = worker_ids[zlib.crc32(d["ip"].encode()) % len(worker_ids)]
+        plan[w].append(d)
+    return plan
+
+
+# --- Worker process ---
+def poll_device(device, flag, out_queue, worker_id, index):
+    """One device's poll loop inside a worker process."""
+    from zk.exception import ZKNetworkError
+    from punch_store import make_punch
+    from reconnect import ReconnectScheduler
+    from poll_cadence import poller_for_device
+    from attendance_decoder import read_attendance
+
+    name, ip, port = device.get("name", device["ip"]), device["ip"], device.get("port", 4370)
+    reconnects = ReconnectScheduler()
+    poller = poller_for_device(device)
+    seen = set()  # keys already sent to the coordinator that are still in the device log
+    stopped = lambda: not flag["on"]
+    while not stopped():
+        conn = None
+        try:
+            conn = connect_device(ip, port, **transport_settings(device))
+            reconnects.on_connected(ip)
+            out_queue.put(("status", worker_id, ip, "connected", ""))
+            roster = conn.get_users()
+            users = {u.user_id: u.name for u in roster}
+            poller.reset()
+            while not stopped():
+                cols = read_attendance(conn, roster)
+                # the worker's read-only view of the index only pre-filters; the coordinator has the final say
+                with index.reading():
+                    selected = cols.select(lambda k: k not in seen and k not in index)
+                fresh = cols.records(i for i, _ in selected)
+                for i in range(0, len(fresh), MERGE_BATCH):
+                    chunk = fresh[i:i + MERGE_BATCH]
+                    out_queue.put(("punches", worker_id, ip, [make_punch(lg, name, ip, users.get(lg.user_id)) for lg in chunk], ""))
+                seen.update(k for _, k in selected)
+                seen &= set(cols.keys())  # bounded by the device log, whatever the worker's uptime
+                reconnects.wait(poller.next_interval(len(fresh)), stopped)
+        except ZKNetworkError as e:
+            out_queue.put(("status", worker_id, ip, "disconnected", str(e)))
+        except Exception as e:
+            out_queue.put(("status", worker_id, ip, "error", str(e)))
+        finally:
+            try: conn.disconnect()
+            except: pass
+        if stopped(): break
+        reconnects.wait(reconnects.on_failure(ip), stopped)
+
+
+def worker_main(worker_id, devices, control_queue, out_queue):
+    from punch_index import PunchIndex
+    index = PunchIndex()
+    flags = {}  # ip -> flag of the poll thread currently owning that device
+
+    def start(device):
+        ip = device["ip"]
+        if ip in flags and flags[ip]["on"]:
+            return
+        flags[ip] = {"on": True}
+        threading.Thread(target=poll_device, args=(device, flags[ip], out_queue, worker_id, index), daemon=True).start()
+
+    for d in devices:
+        start(d)
+    while True:
+        cmd, arg = control_queue.get()
+        if cmd == "add":
+            start(arg)
+        elif cmd == "remove":
+            if arg in flags: flags[arg]["on"] = False
+        elif cmd == "stop":
+            for flag in flags.values(): flag["on"] = False
+            break
+
+
+# --- Coordinator ---
+class ShardedCollector:
+    def __init__(self, devices, workers=4, mode="hash"):
+        self.devices = devices
+        self.mode = mode
+        self.ctx = mp.get_context("spawn")  # same behaviour on Windows and Linux
+        self.out_queue = self.ctx.Queue(maxsize=10000)
+        self.workers = {}  # worker_id -> (process, control_queue)
+        self.plan = assign_devices(devices, list(range(max(1, workers))), mode)
+        self.merged = 0
+        self.device_status = {}  # ip -> (state, detail)
+
+    def start_worker(self, worker_id, devices):
+        control = self.ctx.Queue()
+        p = self.ctx.Process(target=worker_main, args=(worker_id, devices, control, self.out_queue),
+                             name=f"zk-worker-{worker_id}", daemon=True)
+        p.start()
+        self.workers[worker_id] = (p, control)
+        print(f"Worker {worker_id} (pid {p.pid}): {len(devices)} devices")
+
+    def rebalance(self, dead_id):
+        orphans = self.plan.pop(dead_id, [])
+        self.workers.pop(dead_id, None)
+        if not self.workers:
+            # nobody left to take them: bring the shard back up in a fresh process
+            self.plan[dead_id] = orphans
+            self.start_worker(dead_id, orphans)
+            return
+        for d in orphans:
+            target = min(self.plan, key=lambda w: len(self.plan[w]))
+            self.plan[target].append(d)
+            self.workers[target][1].put(("add", d))
+            print(f"Worker {dead_id} died: {d.get('name', d['ip'])} -> worker {target}")
+
+    def locate(self, device):
+        """(worker_id, position) of the plan entry for device, matched by name, else None."""
+        key = device_id(device)
+        for w, devs in self.plan.items():
+            for i, d in enumerate(devs):
+                if device_id(d) == key:
+                    return w, i
+        return None
+
+    def apply_device_changes(self, devices, diff):
+        """Hot reload: start new devices, stop removed ones, move re-addressed ones."""
+        added, removed, changed, updated = diff
+        for d in removed + [old for old, _ in changed]:
+            found = self.locate(d)
+            if found:
+                w, i = found
+                planned = self.plan[w].pop(i)
+                self.workers[w][1].put(("remove", planned["ip"]))  # the address that worker polls
+        for d in added + [new for _, new in changed]:
+            target = min(self.plan, key=lambda w: len(self.plan[w]))
+            self.plan[target].append(d)
+            self.workers[target][1].put(("add", d))
+        for old, new in updated:
+            found = self.locate(new)
+            if not found:
+                continue
+            w, i = found
+            planned, self.plan[w][i] = self.plan[w][i], new  # the plan always holds the current entry
+            if transport_settings(planned) != transport_settings(new):
+                # recalibrated: restart the poll thread on the same worker with the new settings
+                self.workers[w][1].put(("remove", new["ip"]))
+                self.workers[w][1].put(("add", new))
+        print(f"devices.json reloaded: +{len(added)} -{len(removed)} ~{len(changed)} address change(s)")
+
+    def run(self):
+        from punch_index import open_punch_index
+        from sinks import load_sinks, SinkHub
+        from replication import load_replicator
+        index = open_punch_index()
+        sinks = SinkHub(load_sinks())
+        sinks.start()
+        replicator = load_replicator()  # None unless replication.json exists
+        if replicator: replicator.start()
+        for w, devs in self.plan.items():
+            self.start_worker(w, devs)
+        reloads = queue.Queue()
+        watcher = DevicesWatcher(self.devices, lambda devices, diff: reloads.put((devices, diff))).start()
+        last_stats = time.time()
+        try:
+            while True:
+                try:
+                    kind, worker_id, ip, payload, detail = self.out_queue.get(timeout=1)
+                    if kind == "punches":
+                        with index.reading():
+                            fresh = [p for p in payload if p["key"] not in index]
+                        index.add_many([p["key"] for p in fresh])
+                        sinks.emit(fresh)
+                        self.merged += len(fresh)
+                    else:
+                        self.device_status[ip] = (payload, detail)
+                        print(f"[worker {worker_id}] {ip} {payload} {detail}".rstrip())
+                except queue.Empty:
+                    pass
+                while not reloads.empty():
+                    self.apply_device_changes(*reloads.get())
+                for w, (p, _) in list(self.workers.items()):
+                    if not p.is_alive():
+                        print(f"Worker {w} exited with code {p.exitcode}")
+                        self.rebalance(w)
+                if time.time() - last_stats >= STATS_EVERY:
+                    last_stats = time.time()
+                    shards = ", ".join(f"w{w}={len(d)}" for w, d in sorted(self.plan.items()))
+                    print(f"Merged {self.merged} punches · shards {shards} · sinks {sinks.lag()}"
+                          + (f" · central {replicator.lag()}" if replicator else ""))
+        except KeyboardInterrupt:
+            print("Stopping collector...")
+        finally:
+            watcher.stop()
+            for p, control in self.workers.values():
+                control.put(("stop", None))
+            for p, _ in self.workers.values():
+                p.join(5)
+                if p.is_alive(): p.terminate()
+            index.close()
+            sinks.stop()
+            if replicator: replicator.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded multi-process ZK collector")
+    parser.add_argument("--workers", type=int, default=max(1, (mp.cpu_count() or 2) - 1))
+    parser.add_argument("--assign", choices=("hash", "static"), default="hash")
+    args = parser.parse_args()
+    devices = load_devices()
+    if not devices:
+        print("No devices configured.")
+        return
+    ShardedCollector(devices, args.workers, args.assign).run()
+
+
+if __name__ == "__main__":
+    main()
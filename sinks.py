@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque
+
+# Downstream sinks for new punches. Each sink owns a bounded buffer and a
+# flush thread, so a slow or failing sink only ever delays itself.
+#
+# Overflow policies once max_buffer punches are pending (as in WorkQueue):
+#   drop_oldest  - shed the oldest punch, emit() never waits (webhooks, files)
+#   block        - emit() waits for room; for sinks that must not lose punches
+#
+# The punch store is the record everything else reads from, and punches are
+# marked as seen before they reach the sinks, so the database sink blocks and
+# retries forever: a full buffer slows ingest down instead of losing punches.
+
+OVERFLOW_POLICIES = ("drop_oldest", "block")
+
+SINKS_FILE = "sinks.json"
+
+
+class Sink:
+    """Base sink. Subclasses implement write_batch(batch)."""
+
+    def __init__(self, name, max_buffer=10000, batch_size=100, flush_interval=2.0,
+                 max_retries=5, retry_backoff=1.0, max_backoff=60.0, overflow="drop_oldest"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        self.name = name
+        self.overflow = overflow
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries  # None = retry forever
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.buffer = deque()  # (enqueued_at, punch)
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_error = None
+        self.last_flush = None
+
+    # --- Producer side ---
+    def offer(self, punches):
+        now = time.time()
+        with self.cond:
+            for p in punches:
+                while self.overflow == "block" and len(self.buffer) >= self.max_buffer and self.running:
+                    self.cond.notify_all()  # let the flush thread make room
+                    self.cond.wait(1.0)
+                if len(self.buffer) >= self.max_buffer and self.overflow == "drop_oldest":
+                    self.buffer.popleft()  # shed the oldest, never block the caller
+                    self.dropped += 1
+                self.buffer.append((now, p))
+            if len(self.buffer) >= self.batch_size:
+                self.cond.notify_all()
+
+    def lag(self):
+        with self.cond:
+            oldest = self.buffer[0][0] if self.buffer else None
+            return {
+                "pending": len(self.buffer),
+                "oldest_age": round(time.time() - oldest, 1) if oldest else 0.0,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "last_flush": self.last_flush,
+                "last_error": self.last_error,
+            }
+
+    # --- Flush thread ---
+    def start(self):
+        self.open()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"sink-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+        self.close()
+
+    def _take_batch(self):
+        with self.cond:
+            while self.running:
+                if len(self.buffer) >= self.batch_size:
+                    break
+                if self.buffer and time.time() - self.buffer[0][0] >= self.flush_interval:
+                    break
+                wait = self.flush_interval
+                if self.buffer:
+                    wait = max(0.05, self.flush_interval - (time.time() - self.buffer[0][0]))
+                self.cond.wait(wait)
+            n = min(self.batch_size, len(self.buffer))
+            batch = [self.buffer.popleft()[1] for _ in range(n)]
+            if n and self.overflow == "block":
+                self.cond.notify_all()  # room for a blocked emit()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._deliver(batch)
+            elif not self.running:
+                break
+
+    def _deliver(self, batch):
+        attempt = 0
+        while True:
+            try:
+                self.write_batch(batch)
+                self.delivered += len(batch)
+                self.last_flush = time.time()
+                self.last_error = None
+                return
+            except Exception as e:
+                attempt += 1
+                self.last_error = str(e)
+                if self.max_retries is not None and (not self.running or attempt > self.max_retries):
+                    print(f"Sink {self.name}: giving up on {len(batch)} punches: {e}")
+                    self.failed += len(batch)
+                    return
+                time.sleep(min(self.max_backoff, self.retry_backoff * 2 ** (attempt - 1)))
+
+    # --- Subclass hooks ---
+    def open(self):
+        pass
+
+    def write_batch(self, batch):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileSink(Sink):
+    """Appends punches as JSON lines."""
+
+    def __init__(self, name, path="punches.jsonl", **kw):
+        super().__init__(name, **kw)
+        self.path = path
+
+    def write_batch(self, batch):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(p, ensure_ascii=False) + "\n" for p in batch))
+
+
+class WebhookSink(Sink):
+    """POSTs each batch as a JSON array."""
+
+    def __init__(self, name, url, headers=None, timeout=10, **kw):
+        super().__init__(name, **kw)
+        self.url = url
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.timeout = timeout
+
+    def write_batch(self, batch):
+        from urllib.request import Request, urlopen
+        body = json.dumps(batch, ensure_ascii=False).encode("utf-8")
+        with urlopen(Request(self.url, data=body, headers=self.headers, method="POST"), timeout=self.timeout) as resp:
+            if resp.status >= 300:
+                raise IOError(f"HTTP {resp.status} from {self.url}")
+
+
+class QueueSink(Sink):
+    """Local spool-directory queue: one JSON file per batch, written atomically.
+    Consumers pick up *.json files in name order and delete them when done."""
+
+    def __init__(self, name, directory="punch_queue", **kw):
+        super().__init__(name, **kw)
+        self.directory = directory
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def write_batch(self, batch):
+        fname = f"{time.time():017.6f}-{uuid.uuid4().hex[:8]}.json"
+        tmp = os.path.join(self.directory, fname + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(batch, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.directory, fname))
+
+
+class DatabaseSink(Sink):
+    """Writes into the SQLite punch store. Never drops a punch (see the top of the file)."""
+
+    def __init__(self, name, path=None, **kw):
+        kw.setdefault("overflow", "block")
+        kw.setdefault("max_retries", None)
+        super().__init__(name, **kw)
+        self.path = path
+        self.store = None
+
+    def open(self):
+        from punch_store import PunchStore, STORE_FILE
+        self.store = PunchStore(self.path or STORE_FILE)
+
+    def write_batch(self, batch):
+        self.store.add_many(batch)
+
+    def close(self):
+        if self.store:
+            self.store.close()
+
+
+SINK_TYPES = {"file": FileSink, "webhook": WebhookSink, "queue": QueueSink, "database": DatabaseSink}
+DEFAULT_SINKS = [{"type": "database", "name": "store", "batch_size": 200, "flush_interval": 1.0}]
+
+
+def load_sinks(path=SINKS_FILE):
+    """Builds sinks from sinks.json: [{"type": "webhook", "name": "payroll", "url": ..., "batch_size": 50}, ...]"""
+    try:
+        with open(path, "r") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = DEFAULT_SINKS
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+        config = DEFAULT_SINKS
+    return build_sinks(config, path)
+
+
+def build_sinks(config, source=SINKS_FILE):
+    """Sinks from a list of sinks.json-style entries; source only labels errors."""
+    sinks = []
+    for entry in config:
+        entry = dict(entry)
+        kind = entry.pop("type", None)
+        if kind not in SINK_TYPES:
+            print(f"Unknown sink type {kind!r} in {source}, skipping")
+            continue
+        sinks.append(SINK_TYPES[kind](entry.pop("name", kind), **entry))
+    return sinks
+
+
+class SinkHub:
+    """Fans punches out to every sink."""
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def start(self):
+        for s in list(self.sinks):
+            try:
+                s.start()
+            except Exception as e:
+                print(f"Error starting sink {s.name}: {e}")
+                self.sinks.remove(s)
+
+    def emit(self, punches):
+        for s in self.sinks:
+            s.offer(punches)
+
+    def lag(self):
+        return {s.name: s.lag() for s in self.sinks}
+
+    def stop(self):
+        for s in self.sinks:
+            s.stop()
@@ -0,0 +1,329 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import threading
+import tracemalloc
+from datetime import datetime
+
+# Long-running soak test: runs the collector against simulated devices for
+# hours and watches for drift in memory, threads and ingest latency.
+#
+#   python soak_test.py --hours 8 --devices 20 --rate 30 --workdir soak_run
+#   python soak_test.py --hours 24 --gui        # the real v4 window, withdrawn
+#
+# Without --gui the headless collector path is exercised (the same poll loop
+# the sharded collector runs, merged into the punch index and sinks). Samples
+# go to <workdir>/soak_samples.csv; at the end every series that grew more or
+# less monotonically is flagged.
+
+SAMPLE_EVERY = 60
+GROWTH_STEPS = 0.8     # share of non-decreasing steps that counts as "monotonic"
+GROWTH_MIN = 0.10      # and the series must have grown by at least 10% overall
+
+
+# --- Simulated devices ---
+class SimUser:
+    def __init__(self, uid, user_id, name):
+        self.uid, self.user_id, self.name = uid, user_id, name
+
+
+class SimAttendance:
+    def __init__(self, user_id, timestamp, status=0, punch=1, uid=0):
+        self.user_id, self.timestamp, self.status, self.punch, self.uid = user_id, timestamp, status, punch, uid
+
+
+class SimulatedDevice:
+    """Stands in for a pyzk connection. Punches accrue at rate per minute;
+    created maps each punch key to the wall clock time it was generated."""
+
+    def __init__(self, ip, rate, users=300, created=None, capacity=100000):
+        self.ip = ip
+        self.rate = rate
+        self.capacity = capacity  # terminals keep this many records, then overwrite the oldest
+        self.users = [SimUser(i, str(1000 + i), f"Sim User {i}") for i in range(users)]
+        self.logs = []
+        self.created = created if created is not None else {}
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def _accrue(self):
+        now = time.time()
+        n = int((now - self.last) * self.rate / 60)
+        if n:
+            self.last = now
+            for _ in range(n):
+                u = random.choice(self.users)
+                ts = datetime.now().replace(microsecond=0)
+                log = SimAttendance(u.user_id, ts, 0, random.choice((1, 2, 15)), u.uid)
+                self.logs.append(log)
+                self.created.setdefault(f"{u.user_id}_{ts.strftime('%Y-%m-%d %H:%M:%S')}", now)
+            del self.logs[:-self.capacity]
+
+    def get_users(self):
+        return list(self.users)
+
+    def get_attendance(self):
+        with self.lock:
+            self._accrue()
+            return list(self.logs)
+
+    def disconnect(self):
+        pass
+
+
+class SimFleet:
+    def __init__(self, count, rate):
+        self.created = {}
+        self.devices = {f"10.99.0.{i + 1}": SimulatedDevice(f"10.99.0.{i + 1}", rate, created=self.created) for i in range(count)}
+
+    def config(self):
+        return [{"name": f"Sim {i + 1}", "ip": ip, "port": 4370, "poll": {"min": 1, "max": 5}}
+                for i, ip in enumerate(self.devices)]
+
+    def connect(self, ip, port, timeout=10, force_udp=False):
+        return self.devices[ip]
+
+
+# --- Measurements ---
+def rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class LatencyTracker:
+    def __init__(self, created):
+        self.created = created
+        self.lock = threading.Lock()
+        self.window = []
+        self.total = 0
+
+    def wrap(self, hub):
+        emit = hub.emit
+        def tracked(punches):
+            now = time.time()
+            with self.lock:
+                for p in punches:
+                    t0 = self.created.pop(p["key"], None)
+                    if t0 is not None:
+                        self.window.append(now - t0)
+                self.total += len(punches)
+            emit(punches)
+        hub.emit = tracked
+
+    def drain(self):
+        with self.lock:
+            w, self.window = sorted(self.window), []
+        if not w:
+            return 0.0, 0.0
+        return w[len(w) // 2], w[min(len(w) - 1, int(len(w) * 0.95))]
+
+
+class Sampler:
+    def __init__(self, out_path, latency, extra=None):
+        self.out_path = out_path
+        self.latency = latency
+        self.extra = extra or (lambda: {})
+        self.samples = []
+        self.t0 = time.time()
+        self.baseline = None  # taken at the first sample, once imports and warm-up are done
+
+    @staticmethod
+    def snapshot():
+        # the simulated devices' own memory is not the collector's problem
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+
+    def sample(self):
+        snap = self.snapshot()
+        if self.baseline is None:
+            self.baseline = snap
+        traced = sum(s.size for s in snap.statistics("filename"))
+        p50, p95 = self.latency.drain()
+        row = {
+            "elapsed_s": round(time.time() - self.t0),
+            "rss_mb": round(rss_bytes() / 2**20, 1),
+            "traced_mb": round(traced / 2**20, 2),
+            "threads": threading.active_count(),
+            "ingested": self.latency.total,
+            "latency_p50_s": round(p50, 3),
+            "latency_p95_s": round(p95, 3),
+            **self.extra(),
+        }
+        self.samples.append(row)
+        new_file = not os.path.exists(self.out_path)
+        with open(self.out_path, "a", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=list(row))
+            if new_file: w.writeheader()
+            w.writerow(row)
+        print(" ".join(f"{k}={v}" for k, v in row.items()))
+
+    def top_growth(self, limit=10):
+        if self.baseline is None:
+            return []  # stopped before the first sample
+        stats = self.snapshot().compare_to(self.baseline, "lineno")
+        return [str(s) for s in stats[:limit] if s.size_diff > 0]
+
+
+def flag_growth(samples, skip=2):
+    """Series that rose on most steps and grew materially; the warm-up samples are ignored."""
+    flagged = {}
+    rows = samples[skip:]
+    if len(rows) < 4:
+        return flagged
+    for key in rows[0]:
+        if key in ("elapsed_s", "ingested"):
+            continue
+        series = [r[key] for r in rows]
+        steps = [b >= a for a, b in zip(series, series[1:])]
+        first, last = series[0], series[-1]
+        growth = (last - first) / first if first else (1.0 if last > 0 else 0.0)
+        if sum(steps) / len(steps) >= GROWTH_STEPS and growth >= GROWTH_MIN:
+            flagged[key] = (first, last, round(growth * 100, 1))
+    return flagged
+
+
+# --- Runners ---
+def run_headless(fleet, deadline, sampler, latency, every):
+    import sharded_collector
+    from punch_index import open_punch_index
+    from sinks import load_sinks, SinkHub
+    sharded_collector.connect_device = fleet.connect
+    index = open_punch_index()
+    hub = SinkHub(load_sinks())
+    hub.start()
+    latency.wrap(hub)
+
+    class Inbox:
+        def __init__(self):
+            self.items, self.cond = [], threading.Condition()
+        def put(self, item):
+            with self.cond:
+                self.items.append(item)
+                self.cond.notify()
+        def take(self, timeout):
+            with self.cond:
+                if not self.items: self.cond.wait(timeout)
+                items, self.items = self.items, []
+                return items
+
+    inbox = Inbox()
+    flags = {d["ip"]: {"on": True} for d in fleet.config()}
+    for d in fleet.config():
+        threading.Thread(target=sharded_collector.poll_device, args=(d, flags[d["ip"]], inbox, 0, index), daemon=True).start()
+    next_sample = time.time() + every
+    try:
+        while time.time() < deadline:
+            for kind, _, ip, payload, detail in inbox.take(0.5):
+                if kind == "punches":
+                    fresh = [p for p in payload if p["key"] not in index]
+                    index.add_many([p["key"] for p in fresh])
+                    hub.emit(fresh)
+            if time.time() >= next_sample:
+                sampler.sample()
+                next_sample += every
+    finally:
+        for f in flags.values(): f["on"] = False
+        index.close()
+        hub.stop()
+
+
+def run_gui(fleet, deadline, sampler, latency, every):
+    from tkinter import Tk, TclError
+    import zk_realtime_gui_v4 as v4
+    try:
+        root = Tk()
+    except TclError as e:
+        print(f"No display for Tk ({e}), soaking the headless collector instead")
+        return run_headless(fleet, deadline, sampler, latency, every)
+    root.withdraw()
+    v4.connect_device = fleet.connect
+    app = v4.ZKRealtimeApp(root)
+
+    def tk_stats():
+        return {
+            "tk_after_pending": len(root.tk.splitlist(root.tk.call("after", "info"))),
+            "live_rows": len(app.tree_logs.get_children()),
+            "ui_queue": app.ui_queue.depth(),
+            "ingest_queue": app.ingest_queue.depth(),
+        }
+    sampler.extra = tk_stats
+
+    def hook_sinks():
+        if app.sinks is None:
+            return root.after(200, hook_sinks)
+        latency.wrap(app.sinks)
+
+    def tick():
+        if time.time() >= deadline:
+            app.on_close()
+            return
+        sampler.sample()
+        root.after(every * 1000, tick)
+
+    root.after(200, hook_sinks)
+    root.after(every * 1000, tick)
+    root.mainloop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test the collector against simulated devices")
+    parser.add_argument("--hours", type=float, default=4)
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=20, help="punches per minute per device")
+    parser.add_argument("--sample-every", type=int, default=SAMPLE_EVERY, help="seconds")
+    parser.add_argument("--gui", action="store_true", help="run the v4 window (withdrawn) instead of the headless collector")
+    parser.add_argument("--workdir", default="soak_run", help="state files are created here, not in the real data directory")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)
+    fleet = SimFleet(args.devices, args.rate)
+    with open("devices.json", "w") as f:
+        json.dump(fleet.config(), f, indent=1)
+
+    tracemalloc.start(10)
+    latency = LatencyTracker(fleet.created)
+    sampler = Sampler("soak_samples.csv", latency)
+    deadline = time.time() + args.hours * 3600
+    print(f"Soaking {args.devices} simulated devices at {args.rate}/min each for {args.hours}h in {os.getcwd()}")
+    try:
+        (run_gui if args.gui else run_headless)(fleet, deadline, sampler, latency, args.sample_every)
+    except KeyboardInterrupt:
+        print("Interrupted, writing report...")
+
+    flagged = flag_growth(sampler.samples)
+    report = {
+        "samples": len(sampler.samples),
+        "flagged": {k: {"first": a, "last": b, "growth_pct": g} for k, (a, b, g) in flagged.items()},
+        "top_allocation_growth": sampler.top_growth(),
+    }
+    with open("soak_report.json", "w") as f:
+        json.dump(report, f, indent=2)
+    if flagged:
+        for k, (a, b, g) in flagged.items():
+            print(f"⚠️ {k} grew monotonically: {a} -> {b} (+{g}%)")
+    else:
+        print("✅ No monotonic growth detected.")
+    print("Top allocation growth since start:")
+    for line in report["top_allocation_growth"]:
+        print("  " + line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+from user_directory import UserDirectory
+
+
+def roster(n):
+    return {str(i): f"User {i}" for i in range(1, n + 1)}
+
+
+def test_removed_user_leaves_the_index():
+    d = UserDirectory()
+    d.update_device("10.0.0.1", roster(100))
+    added, changed, removed = d.update_device("10.0.0.1", roster(99))  # small diff: incremental path
+    assert removed == ["100"]
+    assert d.search("100") == []
+    assert all(u in d.entries for _, u in d.index)
+
+
+def test_removed_device_leaves_the_index():
+    d = UserDirectory()
+    d.update_device("10.0.0.1", roster(3))
+    d.remove_device("10.0.0.1")  # everything touched: bulk rebuild path
+    assert d.search("1") == [] and d.index == [] and d.ordered == []
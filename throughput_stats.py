@@ -0,0 +1,188 @@
+import time
+import threading
+from tkinter import ttk, Toplevel, Label, StringVar
+
+# Rolling per-device and fleet-wide throughput statistics.
+#
+# Every counter is a ring of HISTORY_BUCKETS fixed-width time buckets, so
+# memory stays constant however long the app runs, and a stale bucket is
+# simply reset when the ring comes round to it again. Per device:
+#
+#   punches/min   new punches over the last WINDOW seconds
+#   last punch    seconds since the device last produced a new punch
+#   fetch ms      average attendance read latency over WINDOW
+#   errors        failed reads / all reads over WINDOW
+#
+# The same figures are kept for the whole fleet. ThroughputWindow shows them
+# with a sparkline of punches per bucket over the full history.
+
+BUCKET_SECONDS = 15
+HISTORY_BUCKETS = 40          # 10 minutes of history
+WINDOW = 300                  # seconds the rates and averages cover
+REFRESH_MS = 2000
+SPARK = "▁▂▃▄▅▆▇█"
+FLEET = "*"                   # key of the fleet-wide stats
+FAILING = 0.5                 # error rate at which a device's row turns red
+
+
+class RingCounter:
+    """Count and sum per time bucket over a fixed ring of buckets."""
+
+    def __init__(self, buckets=HISTORY_BUCKETS, width=BUCKET_SECONDS):
+        self.width = width
+        self.counts = [0] * buckets
+        self.sums = [0.0] * buckets
+        self.slots = [-1] * buckets  # absolute bucket number each position holds
+
+    def _index(self, slot):
+        i = slot % len(self.counts)
+        if self.slots[i] != slot:
+            self.slots[i], self.counts[i], self.sums[i] = slot, 0, 0.0
+        return i
+
+    def add(self, count=1, value=0.0, now=None):
+        i = self._index(int((now or time.time()) // self.width))
+        self.counts[i] += count
+        self.sums[i] += value
+
+    def window(self, seconds, now=None):
+        """(count, sum) over the last `seconds`, current bucket included."""
+        current = int((now or time.time()) // self.width)
+        oldest = current - min(len(self.counts), max(1, round(seconds / self.width))) + 1
+        count, total = 0, 0.0
+        for slot, c, s in zip(self.slots, self.counts, self.sums):
+            if oldest <= slot <= current:
+                count += c
+                total += s
+        return count, total
+
+    def series(self, now=None):
+        """Counts per bucket, oldest first, zeros for buckets with no activity."""
+        current = int((now or time.time()) // self.width)
+        n = len(self.counts)
+        by_slot = {slot: c for slot, c in zip(self.slots, self.counts)}
+        return [by_slot.get(slot, 0) for slot in range(current - n + 1, current + 1)]
+
+
+def sparkline(values):
+    """Scaled to the busiest bucket; any activity shows above the baseline."""
+    top = max(values, default=0) or 1
+    steps = len(SPARK) - 1
+    return "".join(SPARK[(v * steps + top - 1) // top] for v in values)
+
+
+class DeviceStats:
+    def __init__(self):
+        self.punches = RingCounter()
+        self.fetches = RingCounter()  # count = reads, sum = seconds
+        self.errors = RingCounter()
+        self.last_punch = None
+
+    def summary(self, now):
+        punches, _ = self.punches.window(WINDOW, now)
+        reads, latency = self.fetches.window(WINDOW, now)
+        errors, _ = self.errors.window(WINDOW, now)
+        return {
+            "per_minute": punches * 60 / WINDOW,
+            "last_punch_age": None if self.last_punch is None else now - self.last_punch,
+            "fetch_ms": latency / reads * 1000 if reads else None,
+            "error_rate": errors / (reads + errors) if reads + errors else 0.0,
+            "history": self.punches.series(now),
+        }
+
+
+class FleetStats:
+    """Thread-safe; listener and ingest threads record, the Tk thread reads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.devices = {FLEET: DeviceStats()}
+
+    def _get(self, ip):
+        stats = self.devices.get(ip)
+        if stats is None:
+            stats = self.devices[ip] = DeviceStats()
+        return stats
+
+    def record_fetch(self, ip, seconds, ok=True, now=None):
+        now = now or time.time()
+        with self.lock:
+            for stats in (self._get(ip), self.devices[FLEET]):
+                if ok: stats.fetches.add(1, seconds, now)
+                else: stats.errors.add(1, 0.0, now)
+
+    def record_punches(self, ip, count, now=None):
+        if not count:
+            return
+        now = now or time.time()
+        with self.lock:
+            for stats in (self._get(ip), self.devices[FLEET]):
+                stats.punches.add(count, 0.0, now)
+                stats.last_punch = now
+
+    def forget(self, ip):
+        with self.lock:
+            self.devices.pop(ip, None)
+
+    def snapshot(self, now=None):
+        """{ip or FLEET: summary dict}"""
+        now = now or time.time()
+        with self.lock:
+            return {ip: stats.summary(now) for ip, stats in self.devices.items()}
+
+
+def _age(seconds):
+    if seconds is None:
+        return "never"
+    if seconds < 60:
+        return f"{seconds:.0f}s ago"
+    if seconds < 3600:
+        return f"{seconds // 60:.0f}m ago"
+    return f"{seconds // 3600:.0f}h ago"
+
+
+class ThroughputWindow:
+    """Live stats table, one row per device plus the fleet total; refreshes while open."""
+
+    COLUMNS = ("Device", "Punches/min", "Last punch", "Fetch ms", "Errors", "History")
+
+    def __init__(self, root, stats, device_names):
+        self.stats = stats
+        self.device_names = device_names  # callable -> {ip: name}
+        self.win = Toplevel(root)
+        self.win.title("Throughput")
+        self.win.geometry("820x420")
+        self.info_var = StringVar()
+        Label(self.win, textvariable=self.info_var, fg="gray").pack(anchor="e", padx=10)
+        self.tree = ttk.Treeview(self.win, columns=self.COLUMNS, show="headings")
+        widths = {"Device": 200, "Punches/min": 90, "Last punch": 90, "Fetch ms": 80, "Errors": 70, "History": 260}
+        for c in self.COLUMNS:
+            self.tree.heading(c, text=c)
+            self.tree.column(c, width=widths[c], anchor="w" if c in ("Device", "History") else "center")
+        self.tree.tag_configure("fleet", font=("Segoe UI", 9, "bold"))
+        self.tree.tag_configure("failing", foreground="#b00020")
+        self.tree.pack(fill="both", expand=True, padx=10, pady=6)
+        self.refresh()
+
+    def refresh(self):
+        if not self.win.winfo_exists():
+            return
+        snap = self.stats.snapshot()
+        names = self.device_names()
+        rows = [(FLEET, "All devices")] + sorted(((ip, names.get(ip, ip)) for ip in snap if ip != FLEET), key=lambda r: r[1] or "")
+        for ip, label in rows:
+            s = snap.get(ip)
+            if s is None:
+                continue
+            values = (label, f"{s['per_minute']:.1f}", _age(s["last_punch_age"]),
+                      "-" if s["fetch_ms"] is None else f"{s['fetch_ms']:.0f}",
+                      f"{s['error_rate']:.0%}", sparkline(s["history"]))
+            tags = ("fleet",) if ip == FLEET else ("failing",) if s["error_rate"] >= FAILING else ()
+            if self.tree.exists(ip):
+                self.tree.item(ip, values=values, tags=tags)
+            else:
+                self.tree.insert("", "end", iid=ip, values=values, tags=tags)
+        for ip in set(self.tree.get_children()) - {ip for ip, _ in rows}:
+            self.tree.delete(ip)
+        self.info_var.set(f"Rates over the last {WINDOW // 60} min · history {HISTORY_BUCKETS * BUCKET_SECONDS // 60} min in {BUCKET_SECONDS}s buckets")
+        self.win.after(REFRESH_MS, self.refresh)
@@ -0,0 +1,192 @@
+import io
+import os
+import csv
+import time
+import shutil
+import sqlite3
+import argparse
+import calendar
+import tempfile
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from punch_store import STORE_FILE, TS_FORMAT
+
+# Monthly timesheets for the whole roster, straight from the punch store.
+#
+#   python timesheet_report.py --month 2026-09 --out reports
+#
+# writes two CSV files (UTF-8 with BOM, so Excel opens them as-is):
+#
+#   timesheet_2026-09.csv          one row per employee per day: first in,
+#                                  last out, punch count, worked time, status
+#   timesheet_2026-09_summary.csv  one row per employee: days present, total
+#                                  worked, days with a missing punch
+#
+# Punches of a day are paired in order (in, out, in, out, ...) and worked
+# time is the sum of the pairs; an odd count means a missing punch. Shifts
+# that cross midnight are counted as two days.
+#
+# The roster is split into contiguous user ranges and each range is built
+# by a worker process with its own read-only connection, one employee at a
+# time, into a part file. Parts are appended to the output in roster order
+# as they finish, so memory stays bounded by one employee-month per worker.
+
+DAILY_HEADER = ("User ID", "Name", "Date", "Weekday", "First In", "Last Out", "Punches", "Worked", "Status")
+SUMMARY_HEADER = ("User ID", "Name", "Days Present", "Worked", "Missing Punch Days", "First Punch", "Last Punch")
+CHUNKS_PER_WORKER = 4  # more, smaller ranges than workers so a slow range doesn't hold up the rest
+
+
+def month_bounds(month):
+    """'2026-09' -> ('2026-09-01 00:00:00', '2026-10-01 00:00:00', days in month)"""
+    first = datetime.strptime(month, "%Y-%m").date()
+    days = calendar.monthrange(first.year, first.month)[1]
+    nxt = first + timedelta(days=days)
+    return f"{first} 00:00:00", f"{nxt} 00:00:00", days
+
+
+def previous_month(today=None):
+    today = today or date.today()
+    return (today.replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+
+
+def user_order(user_id):
+    return (0, int(user_id), "") if user_id.isdigit() else (1, 0, user_id)
+
+
+def hhmm(seconds):
+    minutes = int(seconds) // 60
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def open_readonly(db):
+    return sqlite3.connect(f"file:{db}?mode=ro", uri=True, timeout=30)
+
+
+def load_roster(db, start, end):
+    """[(user_id, name)] of everyone on a device roster or with punches in the month."""
+    conn = open_readonly(db)
+    try:
+        names = dict(conn.execute("SELECT user_id, MAX(name) FROM users GROUP BY user_id"))
+        for uid, name in conn.execute("SELECT user_id, MAX(name) FROM punches WHERE timestamp >= ? AND timestamp < ? GROUP BY user_id", (start, end)):
+            if not names.get(uid):
+                names[uid] = name
+    finally:
+        conn.close()
+    return sorted(((uid, name or "") for uid, name in names.items()), key=lambda u: user_order(u[0]))
+
+
+def day_rows(user_id, name, first_day, days, stamps):
+    """Daily rows + summary row for one employee; stamps are sorted timestamp strings."""
+    by_day = {}
+    for ts in stamps:
+        by_day.setdefault(ts[:10], []).append(ts)
+    rows, present, missing, worked_total = [], 0, 0, 0.0
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        key = day.isoformat()
+        punches = by_day.get(key, ())
+        worked, status = 0.0, "No punches"
+        if punches:
+            present += 1
+            secs = [int(ts[11:13]) * 3600 + int(ts[14:16]) * 60 + int(ts[17:19]) for ts in punches]
+            worked = sum(secs[i + 1] - secs[i] for i in range(0, len(secs) - 1, 2))
+            status = "Missing punch" if len(secs) % 2 else "OK"
+            missing += len(secs) % 2
+        worked_total += worked
+        rows.append((user_id, name, key, day.strftime("%a"),
+                     punches[0][11:16] if punches else "",
+                     punches[-1][11:16] if len(punches) > 1 else "",
+                     len(punches), hhmm(worked) if punches else "", status))
+    summary = (user_id, name, present, hhmm(worked_total), missing,
+               stamps[0] if stamps else "", stamps[-1] if stamps else "")
+    return rows, summary, missing
+
+
+def build_part(db, start, end, days, users, part):
+    """Worker: writes <part>.daily / <part>.summary for a slice of the roster."""
+    first_day = datetime.strptime(start, TS_FORMAT).date()
+    conn = open_readonly(db)
+    punches = missing = 0
+    try:
+        with open(part + ".daily", "w", newline="", encoding="utf-8") as daily, \
+             open(part + ".summary", "w", newline="", encoding="utf-8") as summary:
+            daily_out, summary_out = csv.writer(daily), csv.writer(summary)
+            for user_id, name in users:
+                # (user_id, timestamp) is the store's unique index: one range scan per employee
+                stamps = [r[0] for r in conn.execute(
+                    "SELECT timestamp FROM punches WHERE user_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+                    (user_id, start, end))]
+                rows, total, m = day_rows(user_id, name, first_day, days, stamps)
+                daily_out.writerows(rows)
+                summary_out.writerow(total)
+                punches += len(stamps)
+                missing += m
+    finally:
+        conn.close()
+    return len(users), punches, missing
+
+
+def _append(out, path):
+    with open(path, "rb") as f:
+        shutil.copyfileobj(f, out)
+    os.remove(path)
+
+
+def _start_csv(path, header):
+    f = open(path, "wb")
+    line = io.StringIO()
+    csv.writer(line).writerow(header)
+    f.write(b"\xef\xbb\xbf" + line.getvalue().encode("utf-8"))  # BOM: Excel reads the file as UTF-8
+    return f
+
+
+def build_report(month, db=STORE_FILE, out_dir=".", workers=None):
+    """Builds both CSV files for month ('YYYY-MM'); returns a stats dict."""
+    t0 = time.perf_counter()
+    start, end, days = month_bounds(month)
+    roster = load_roster(db, start, end)
+    workers = workers or os.cpu_count() or 1
+    size = max(1, -(-len(roster) // (workers * CHUNKS_PER_WORKER)))
+    chunks = [roster[i:i + size] for i in range(0, len(roster), size)]
+    os.makedirs(out_dir, exist_ok=True)
+    daily_path = os.path.join(out_dir, f"timesheet_{month}.csv")
+    summary_path = os.path.join(out_dir, f"timesheet_{month}_summary.csv")
+    users = punches = missing = 0
+    with tempfile.TemporaryDirectory(dir=out_dir) as tmp, ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(build_part, db, start, end, days, chunk, os.path.join(tmp, f"part{i:05d}"))
+                   for i, chunk in enumerate(chunks)]
+        daily, summary = _start_csv(daily_path, DAILY_HEADER), _start_csv(summary_path, SUMMARY_HEADER)
+        try:
+            for i, future in enumerate(futures):
+                n, p, m = future.result()  # in roster order; later parts keep building meanwhile
+                users, punches, missing = users + n, punches + p, missing + m
+                part = os.path.join(tmp, f"part{i:05d}")
+                _append(daily, part + ".daily")
+                _append(summary, part + ".summary")
+        finally:
+            daily.close()
+            summary.close()
+    return {"month": month, "users": users, "punches": punches, "missing_days": missing,
+            "daily": daily_path, "summary": summary_path, "workers": workers,
+            "seconds": time.perf_counter() - t0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build monthly timesheets from the punch store")
+    parser.add_argument("--month", default=previous_month(), help="YYYY-MM (default: last month)")
+    parser.add_argument("--db", default=STORE_FILE)
+    parser.add_argument("--out", default=".", help="output directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ {args.db} not found")
+        return
+    r = build_report(args.month, args.db, args.out, args.workers)
+    print(f"✅ {r['month']}: {r['users']} employees, {r['punches']} punches, "
+          f"{r['missing_days']} day(s) with a missing punch in {r['seconds']:.1f}s ({r['workers']} workers)")
+    print(f"   {r['daily']}\n   {r['summary']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import math
+import time
+import argparse
+from datetime import datetime, timedelta
+from device_config import DEVICES_FILE, load_devices, save_devices, device_id
+
+# Per-device transport calibration. For every transport option (TCP, UDP)
+# a few connects are timed and one full attendance read measures bulk
+# throughput. The fastest working option (TCP unless UDP is clearly faster)
+# and a socket timeout sized from what was observed are stored in the
+# device's "transport" section:
+#
+#   "transport": {"udp": false, "timeout": 8, "calibrated_at": "2026-10-19 09:12:40",
+#                 "connect_ms": 140, "read_s": 2.1, "read_rps": 9500}
+#
+# connect_device() honours udp/timeout; the collector re-runs calibration
+# once it is older than REVALIDATE_AFTER.
+#
+#   python transport_tuning.py              # calibrate devices that are due
+#   python transport_tuning.py --all        # recalibrate everything now
+#
+# pyzk fixes its transfer chunk size (64 KB over TCP, 16 KB over UDP), so
+# packet size is reported through read_rps but cannot be tuned here.
+
+TRANSPORTS = {"tcp": False, "udp": True}  # name -> force_udp
+DEFAULT_TIMEOUT = 10
+PROBE_TIMEOUT = 15       # generous while measuring, so slow links still report numbers
+MIN_TIMEOUT = 5
+MAX_TIMEOUT = 60
+SAFETY = 3               # timeout = SAFETY x the slowest single wait we observed
+CONNECT_TRIALS = 3
+UDP_MARGIN = 0.8         # UDP only wins when it reads at least 20% faster than TCP
+REVALIDATE_AFTER = timedelta(days=7)
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+CHUNK_BYTES = {"tcp": 0xFFC0, "udp": 16 * 1024}
+RECORD_BYTES = 40        # worst case attendance record size
+
+
+def transport_settings(device):
+    """The ZK() keyword arguments for a device entry, defaults if uncalibrated."""
+    t = (device or {}).get("transport") or {}
+    return {"timeout": t.get("timeout", DEFAULT_TIMEOUT), "force_udp": bool(t.get("udp", False))}
+
+
+def is_due(device, now=None):
+    t = device.get("transport") or {}
+    try:
+        at = datetime.strptime(t["calibrated_at"], TS_FORMAT)
+    except (KeyError, ValueError):
+        return True
+    return (now or datetime.now()) - at >= REVALIDATE_AFTER
+
+
+def measure(ip, port, force_udp, trials=CONNECT_TRIALS):
+    """Times connects and one bulk read over one transport. Returns None if it never connected."""
+    from zk import ZK
+    connects, conn = [], None
+    for i in range(trials):
+        t0 = time.perf_counter()
+        try:
+            conn = ZK(ip, port=port, timeout=PROBE_TIMEOUT, force_udp=force_udp).connect()
+        except Exception as e:
+            print(f"  {ip} {'udp' if force_udp else 'tcp'} connect failed: {e}")
+            conn = None
+            continue
+        connects.append(time.perf_counter() - t0)
+        if i < trials - 1:
+            conn.disconnect()
+    if conn is None:
+        return None
+    try:
+        t0 = time.perf_counter()
+        records = len(conn.get_attendance())
+        read_s = time.perf_counter() - t0
+    except Exception as e:
+        print(f"  {ip} {'udp' if force_udp else 'tcp'} bulk read failed: {e}")
+        return None
+    finally:
+        try: conn.disconnect()
+        except Exception: pass
+    return {"connect_s": sorted(connects)[len(connects) // 2], "connect_max_s": max(connects),
+            "read_s": read_s, "records": records}
+
+
+def pick_timeout(name, m):
+    # the longest single recv is roughly one chunk's share of the bulk read (or the
+    # device preparing a small log in one go); connects bound it from below
+    chunks = max(1, math.ceil(m["records"] * RECORD_BYTES / CHUNK_BYTES[name]))
+    slowest = max(m["connect_max_s"], m["read_s"] / chunks)
+    return int(min(MAX_TIMEOUT, max(MIN_TIMEOUT, math.ceil(slowest * SAFETY))))
+
+
+def calibrate_device(ip, port=4370, trials=CONNECT_TRIALS):
+    """Measures every transport and returns the best "transport" section, or None if none worked."""
+    results = {}
+    for name, force_udp in TRANSPORTS.items():
+        m = measure(ip, port, force_udp, trials)
+        if m is not None:
+            results[name] = m
+            print(f"  {ip} {name}: connect {m['connect_s'] * 1000:.0f} ms, "
+                  f"{m['records']} records in {m['read_s']:.2f}s")
+    if not results:
+        return None
+    name = "tcp" if "tcp" in results else "udp"
+    if name == "tcp" and "udp" in results and results["udp"]["read_s"] < results["tcp"]["read_s"] * UDP_MARGIN:
+        name = "udp"
+    m = results[name]
+    return {
+        "udp": TRANSPORTS[name],
+        "timeout": pick_timeout(name, m),
+        "calibrated_at": datetime.now().strftime(TS_FORMAT),
+        "connect_ms": round(m["connect_s"] * 1000),
+        "read_s": round(m["read_s"], 2),
+        "read_rps": round(m["records"] / m["read_s"]) if m["read_s"] else None,
+    }
+
+
+def save_transport(device, transport, path=DEVICES_FILE):
+    """Writes one device's calibration back into devices.json, leaving other entries alone."""
+    devices = load_devices(path)
+    for d in devices:
+        if device_id(d) == device_id(device):
+            d["transport"] = transport
+            break
+    else:
+        return False
+    save_devices(devices, path)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate TCP/UDP and timeouts per device")
+    parser.add_argument("--all", action="store_true", help="recalibrate devices that are not due yet")
+    parser.add_argument("--device", help="only this device (name or ip)")
+    parser.add_argument("--trials", type=int, default=CONNECT_TRIALS)
+    parser.add_argument("--devices-file", default=DEVICES_FILE)
+    args = parser.parse_args()
+
+    for d in load_devices(args.devices_file):
+        if args.device and args.device not in (d.get("name"), d.get("ip")):
+            continue
+        if not (args.all or args.device or is_due(d)):
+            print(f"{device_id(d)}: calibrated {d['transport']['calibrated_at']}, skipping")
+            continue
+        print(f"Calibrating {device_id(d)} ({d['ip']}:{d.get('port', 4370)})...")
+        t = calibrate_device(d["ip"], d.get("port", 4370), args.trials)
+        if t is None:
+            print(f"❌ {device_id(d)}: unreachable over every transport, keeping previous settings")
+            continue
+        save_transport(d, t, args.devices_file)
+        print(f"✅ {device_id(d)}: {'UDP' if t['udp'] else 'TCP'}, timeout {t['timeout']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import bisect
+from collections import Counter
+from tkinter import ttk, StringVar, Frame, Label, Entry, Scrollbar, BOTH, LEFT, RIGHT, Y
+
+# Merged user directory for the whole fleet, and the panel that shows it.
+#
+# Each device's roster is kept separately, so every user knows which devices
+# enrolled them:
+#
+#   directory.update_device("192.168.30.199", {"1001": "Rahim", ...}, "Main (1st Floor)")
+#   -> (added, changed, removed) user ids in the merged view
+#
+# A reconnect that brings back the same roster changes nothing. Names that
+# disagree between devices resolve to the most common one. Search is a
+# prefix match on the user id or any word of the name, answered by bisecting
+# a sorted token index, so it stays instant with thousands of users.
+#
+# The panel only touches rows that were inserted, changed or removed.
+
+PANEL_LIMIT = 1000  # rows rendered at most; narrow with the search box to see the rest
+
+
+def sort_key(user_id):
+    """Numeric ids in numeric order, then the rest alphabetically."""
+    return (0, int(user_id), "") if user_id.isdigit() else (1, 0, user_id)
+
+
+def tokens(user_id, name):
+    return {user_id.lower(), *(name or "").lower().split()}
+
+
+class UserDirectory:
+    def __init__(self):
+        self.rosters = {}  # ip -> {user_id: name} as last read from that device
+        self.labels = {}   # ip -> device name shown in the Devices column
+        self.sources = {}  # user_id -> {ip: name}
+        self.entries = {}  # user_id -> (name, device names)
+        self.ordered = []  # sorted (sort_key, user_id) of every user
+        self.index = []    # sorted (token, user_id)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, user_id):
+        return user_id in self.entries
+
+    def name(self, user_id, default=None):
+        entry = self.entries.get(user_id)
+        return entry[0] if entry and entry[0] else default
+
+    def devices(self, user_id):
+        entry = self.entries.get(user_id)
+        return entry[1] if entry else ()
+
+    # --- Updates ---
+    def update_device(self, ip, users, label=None):
+        """Replaces one device's roster; returns (added, changed, removed) user ids."""
+        users = {str(k): v for k, v in users.items() if str(k)}
+        old = self.rosters.get(ip, {})
+        self.rosters[ip] = users
+        label = label or ip
+        if self.labels.get(ip) != label:
+            self.labels[ip] = label
+            touched = old.keys() | users.keys()
+        else:
+            touched = {u for u in old.keys() | users.keys() if u not in old or u not in users or old[u] != users[u]}
+        for u in touched:
+            src = self.sources.setdefault(u, {})
+            if u in users: src[ip] = users[u]
+            else: src.pop(ip, None)
+        return self._apply(touched)
+
+    def remove_device(self, ip):
+        old = self.rosters.pop(ip, {})
+        self.labels.pop(ip, None)
+        for u in old:
+            self.sources.get(u, {}).pop(ip, None)
+        return self._apply(old.keys())
+
+    def _merge(self, user_id):
+        src = self.sources.get(user_id)
+        if not src:
+            self.sources.pop(user_id, None)
+            return None
+        names = Counter(n for n in src.values() if n)
+        name = names.most_common(1)[0][0] if names else ""
+        return name, tuple(sorted(self.labels.get(ip, ip) for ip in src))
+
+    def _apply(self, touched):
+        added, changed, removed = [], [], []
+        bulk = len(touched) > len(self.entries) // 4  # rebuilding the indexes beats many inserts
+        for u in touched:
+            old, new = self.entries.get(u), self._merge(u)
+            if old == new:
+                continue
+            if new is None:
+                del self.entries[u]
+                removed.append(u)
+            else:
+                self.entries[u] = new
+                (changed if old else added).append(u)
+            if bulk:
+                continue
+            if old is None or new is None:
+                self._toggle(self.ordered, (sort_key(u), u), new is not None)
+            if old is None or new is None or old[0] != new[0]:
+                for t in tokens(u, old[0] if old else None): self._toggle(self.index, (t, u), False)
+                if new is not None:
+                    for t in tokens(u, new[0]): self._toggle(self.index, (t, u), True)
+        if bulk and (added or changed or removed):
+            self.ordered = sorted((sort_key(u), u) for u in self.entries)
+            self.index = sorted((t, u) for u, (name, _) in self.entries.items() for t in tokens(u, name))
+        return added, changed, removed
+
+    @staticmethod
+    def _toggle(items, item, present):
+        i = bisect.bisect_left(items, item)
+        found = i < len(items) and items[i] == item
+        if present and not found:
+            items.insert(i, item)
+        elif not present and found:
+            del items[i]
+
+    # --- Search ---
+    def search(self, prefix="", limit=None):
+        """User ids whose id or a word of whose name starts with prefix, in id order."""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return [u for _, u in self.ordered[:limit]]
+        hits = set()
+        i = bisect.bisect_left(self.index, (prefix,))
+        while i < len(self.index) and self.index[i][0].startswith(prefix):
+            hits.add(self.index[i][1])
+            i += 1
+        return sorted(hits, key=sort_key)[:limit]
+
+
+class UserPanel:
+    """Treeview over a UserDirectory with a search box. Runs on the Tk thread."""
+
+    def __init__(self, parent, directory, height=25):
+        self.directory = directory
+        self.shown = {}  # user_id -> values currently in the tree
+        bar = Frame(parent)
+        bar.pack(fill="x")
+        Label(bar, text="Search:").pack(side=LEFT)
+        self.search_var = StringVar()
+        Entry(bar, textvariable=self.search_var, width=18).pack(side=LEFT, padx=4)
+        self.count_var = StringVar()
+        Label(bar, textvariable=self.count_var, fg="gray").pack(side=RIGHT)
+        self.search_var.trace_add("write", lambda *_: self.refresh())
+
+        frame = Frame(parent)
+        frame.pack(fill=BOTH, expand=True)
+        self.tree = ttk.Treeview(frame, columns=("User ID", "Name", "Devices"), show="headings", height=height)
+        self.tree.heading("User ID", text="User ID")
+        self.tree.heading("Name", text="Name")
+        self.tree.heading("Devices", text="Devices")
+        self.tree.column("User ID", width=70, anchor="center")
+        self.tree.column("Name", width=150)
+        self.tree.column("Devices", width=90)
+        scroll = Scrollbar(frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side=LEFT, fill=Y, expand=True)
+        scroll.pack(side=RIGHT, fill=Y)
+
+    def _values(self, user_id):
+        name, devices = self.directory.entries[user_id]
+        return (user_id, name, ", ".join(devices) if len(devices) <= 2 else f"{len(devices)} devices")
+
+    def refresh(self):
+        """Brings the tree in line with the directory and the search box, row by row."""
+        wanted = self.directory.search(self.search_var.get(), PANEL_LIMIT + 1)
+        more = len(wanted) > PANEL_LIMIT
+        wanted = wanted[:PANEL_LIMIT]
+        keep = set(wanted)
+        gone = [u for u in self.shown if u not in keep]
+        if gone:
+            self.tree.delete(*gone)
+            for u in gone: del self.shown[u]
+        # both lists are in id order, so after the deletes row i is the i-th wanted id
+        for i, u in enumerate(wanted):
+            values = self._values(u)
+            if u not in self.shown:
+                self.tree.insert("", i, iid=u, values=values)
+            elif self.shown[u] != values:
+                self.tree.item(u, values=values)
+            else:
+                continue
+            self.shown[u] = values
+        total = len(self.directory)
+        self.count_var.set(f"{len(wanted)}{'+' if more else ''} of {total} users" if len(wanted) < total else f"{total} users")
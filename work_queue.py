@@ -0,0 +1,141 @@
+import json
+import time
+import threading
+from collections import deque
+
+# Bounded hand-off between device workers (producers) and consumers.
+#
+# Overload policies once maxsize items are queued:
+#   block        - put() waits for room (the poll loop slows down with the consumer)
+#   drop_oldest  - the oldest queued item is discarded (fine for UI refreshes)
+#   spill        - overflow is appended to a JSON-lines file and read back in
+#                  order once the consumer catches up (items must be JSON-able)
+
+POLICIES = ("block", "drop_oldest", "spill")
+
+
+class WorkQueue:
+    def __init__(self, name, maxsize=1000, policy="block", spill_file=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}, expected one of {POLICIES}")
+        if policy == "spill" and not spill_file:
+            raise ValueError("spill policy needs a spill_file")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.spill_file = spill_file
+        self.items = deque()  # (enqueued_at, item)
+        self.cond = threading.Condition()
+        self.spilled = 0      # items currently on disk
+        self.spill_offset = 0
+        self.dropped = 0
+        self.total_in = 0
+        self.total_out = 0
+        self.wait_max = 0.0
+        self.wait_avg = 0.0   # EWMA of time-in-queue, seconds
+        if policy == "spill":
+            self._recover_spill()
+
+    # --- Spill file ---
+    def _recover_spill(self):
+        """Picks up items spilled by a previous run that never got consumed."""
+        try:
+            with open(self.spill_file, "r", encoding="utf-8") as f:
+                self.spilled = sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            pass
+
+    def _spill(self, entry):
+        with open(self.spill_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.spilled += 1
+
+    def _unspill(self):
+        """Moves spilled items back into memory, oldest first, while there is room."""
+        room = self.maxsize - len(self.items)
+        if room <= 0 or not self.spilled:
+            return
+        with open(self.spill_file, "r", encoding="utf-8") as f:
+            f.seek(self.spill_offset)
+            while room > 0:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    ts, item = json.loads(line)
+                    self.items.append((ts, item))
+                    self.spilled -= 1
+                    room -= 1
+            self.spill_offset = f.tell()
+        if not self.spilled:
+            open(self.spill_file, "w").close()
+            self.spill_offset = 0
+
+    # --- Producer ---
+    def put(self, item, timeout=None):
+        """Returns False only when a blocking put timed out."""
+        entry = (time.time(), item)
+        with self.cond:
+            self.total_in += 1
+            if self.policy == "spill" and self.spilled:
+                self._spill(entry)  # keep FIFO order behind what is already on disk
+            elif len(self.items) < self.maxsize:
+                self.items.append(entry)
+            elif self.policy == "drop_oldest":
+                self.items.popleft()
+                self.dropped += 1
+                self.items.append(entry)
+            elif self.policy == "spill":
+                self._spill(entry)
+            else:
+                deadline = None if timeout is None else time.time() + timeout
+                while len(self.items) >= self.maxsize:
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        self.total_in -= 1
+                        return False
+                    self.cond.wait(remaining)
+                self.items.append(entry)
+            self.cond.notify_all()
+            return True
+
+    # --- Consumer ---
+    def get_many(self, max_items=100, timeout=None):
+        """Waits up to timeout for at least one item, then returns up to max_items."""
+        with self.cond:
+            if not self.items and not self.spilled:
+                self.cond.wait(timeout)
+            if not self.items:
+                self._unspill()
+            out = []
+            now = time.time()
+            while self.items and len(out) < max_items:
+                ts, item = self.items.popleft()
+                wait = now - ts
+                self.wait_max = max(self.wait_max, wait)
+                self.wait_avg = wait if not self.total_out else 0.9 * self.wait_avg + 0.1 * wait
+                self.total_out += 1
+                out.append(item)
+            if self.spilled:
+                self._unspill()
+            if out:
+                self.cond.notify_all()  # wake blocked producers
+            return out
+
+    def depth(self):
+        with self.cond:
+            return len(self.items) + self.spilled
+
+    def stats(self):
+        with self.cond:
+            oldest = self.items[0][0] if self.items else None
+            return {
+                "depth": len(self.items) + self.spilled,
+                "spilled": self.spilled,
+                "dropped": self.dropped,
+                "in": self.total_in,
+                "out": self.total_out,
+                "oldest_age": round(time.time() - oldest, 2) if oldest else 0.0,
+                "wait_avg": round(self.wait_avg, 3),
+                "wait_max": round(self.wait_max, 3),
+            }
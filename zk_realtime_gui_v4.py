@@ -1,44 +1,70 @@
 # zk_realtime_gui_v8_final.py
-import time, json, threading
+import time, queue, threading
+STARTUP_T0 = time.perf_counter()
 from datetime import datetime
-from tkinter import Tk, Label, ttk, StringVar, END, Button, Frame, BOTH, RIGHT, LEFT, Y, Checkbutton, IntVar, Toplevel, Listbox, MULTIPLE, Entry,font
-from tkcalendar import DateEntry
-from zk import ZK
-from zk.exception import ZKNetworkError
+from collections import Counter
+from tkinter import Tk, Label, ttk, StringVar, END, Button, Frame, BOTH, RIGHT, LEFT, Y, Checkbutton, IntVar, Toplevel, Listbox, MULTIPLE, Entry, Scrollbar
+from work_queue import WorkQueue
+from reconnect import ReconnectScheduler
+from poll_cadence import poller_for_device
+from device_config import DEVICES_FILE, load_devices, DevicesWatcher
+from session_manager import SessionManager, INTERACTIVE, BACKGROUND
+from transport_tuning import transport_settings
+from device_lease import LeaseManager, RENEW_EVERY
+from attendance_decoder import read_attendance
+from fleet_table import FleetTable
+from user_directory import UserDirectory, UserPanel
+from throughput_stats import FleetStats, ThroughputWindow, FLEET
+from punch_stream import PunchStream, LATEST
+# tkcalendar, pyzk and the punch index are imported on first use so the window paints immediately
 
-PROCESSED_FILE = "processed_logs.json"
-DEVICES_FILE = "devices.json"
 MAX_LOGS = 100  # max punches to show in real-time table
-
-def load_devices():
-    try:
-        with open(DEVICES_FILE, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading {DEVICES_FILE}: {e}")
-        return []
-
-def connect_device(ip, port):
-    zk = ZK(ip, port=port, timeout=10)
+INGEST_QUEUE_SIZE = 5000  # punches held in memory between listeners and the ingest consumer
+INGEST_QUEUE_POLICY = "spill"  # block | drop_oldest | spill
+INGEST_SPILL_FILE = "ingest_spill.jsonl"
+UI_QUEUE_SIZE = 2000  # pending UI updates; oldest are dropped when the Tk thread falls behind
+DROPPABLE_UI = {"punch", "device", "status"}  # display refreshes a later one supersedes; anything else is never dropped
+UI_PUMP_MS = 100
+UI_PUMP_BATCH = 300
+MAX_CONCURRENT_CONNECTS = 4  # fleet-wide cap on connect attempts in flight
+API_PORT = 8787  # read-only HTTP query API on localhost; None to disable
+SEARCH_PAGE_SIZE = 200  # rows fetched from the punch store per page in the Punch Logs window
+STREAM_POLL_SECONDS = 2  # how often to pick up punches other instances stored
+TRANSPORT_CHECK_MINUTES = 60  # how often to look for devices whose transport calibration is due
+SEARCH_SORT_COLUMNS = {"SL": "seq", "User ID": "user_id", "Name": "name", "Timestamp": "timestamp", "Punch Type": "punch", "Device Name": "device"}
+
+def connect_device(ip, port, timeout=10, force_udp=False):
+    from zk import ZK
+    zk = ZK(ip, port=port, timeout=timeout, force_udp=force_udp)
     return zk.connect()
 
-def get_log_key(log):
-    return f"{log.user_id}_{log.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
-
 def load_processed_logs():
-    try:
-        with open(PROCESSED_FILE, "r") as f:
-            return set(json.load(f))
-    except:
-        return set()
-
-def save_processed_logs(logs):
-    with open(PROCESSED_FILE, "w") as f:
-        json.dump(list(logs), f)
-
-def get_punch_type(log):
+    from punch_index import open_punch_index
+    return open_punch_index()
+
+def save_processed_logs(logs, new_keys):
+    logs.add_many(new_keys)
+
+def start_sinks():
+    from sinks import load_sinks, SinkHub, DatabaseSink
+    sinks = load_sinks()
+    if not any(isinstance(s, DatabaseSink) for s in sinks):
+        sinks.append(DatabaseSink("store"))  # the Punch Logs window reads from the store
+    hub = SinkHub(sinks)
+    hub.start()
+    return hub
+
+def start_rules():
+    from punch_rules import load_rules, RULES_FILE
+    from sinks import build_sinks, SinkHub
+    engine, sink_config = load_rules()
+    hub = SinkHub(build_sinks(sink_config, RULES_FILE))
+    hub.start()
+    return engine, hub
+
+def get_punch_type(punch):
     punch_map = {0:"Finger",1:"Finger",2:"Card",3:"Face",4:"Password",5:"Palm",255:"Finger"}
-    return punch_map.get(log.punch, f"Unknown({log.punch})")
+    return punch_map.get(punch, f"Unknown({punch})")
 
 class ZKRealtimeApp:
     def __init__(self, root):
@@ -48,30 +74,36 @@ class ZKRealtimeApp:
         self.root.resizable(False, False)
 
         self.devices = load_devices()
-        self.connections = {}
+        self.sessions = SessionManager(self.connect_device)  # one serialized pyzk session per device
         self.device_threads = {}
-        self.running_flags = {}
-        self.last_logs = load_processed_logs()
+        self.running_flags = {}  # ip -> token of the listener that should be running
+        self.pollers = {}
+        self.last_logs = None  # dedup index, opened in the background after first paint
+        self.index_ready = threading.Event()
+        self.sinks = None
+        self.rules = None  # alert rule engine, evaluated on the ingest thread
+        self.alerts = None  # where alerts go (alerts.jsonl unless rules.json says otherwise)
+        self.store = None  # read side of the punch store (the database sink writes)
+        self.replicator = None  # ships the store to the central store (replication.json)
+        self.pipeline_var = StringVar(value="")
+        self.ingest_queue = WorkQueue("ingest", INGEST_QUEUE_SIZE, INGEST_QUEUE_POLICY, INGEST_SPILL_FILE)
+        self.ui_queue = WorkQueue("ui", UI_QUEUE_SIZE, "drop_oldest")
+        self.control_queue = queue.SimpleQueue()  # pipeline ticks, device reloads, callbacks: unbounded
+        self.pending_keys = set()  # fetched but not yet through the ingest consumer
+        self.pending_lock = threading.Lock()
+        self.reconnects = ReconnectScheduler(max_concurrent=MAX_CONCURRENT_CONNECTS)
+        self.leases = LeaseManager()  # one polling instance per device across every copy of the app
         self.status_var = StringVar(value="🔌 Waiting...")
         self.sl_counter = 0
         self.auto_connect_var = IntVar(value=1)
-        self.uid_name_map = {}  # track all users
+        self.directory = UserDirectory()  # every device's roster, merged
+        self.throughput = FleetStats()  # rolling punches/min, read latency and errors per device
 
         # --- Top Frame: Devices ---
         top_frame = Frame(root)
         top_frame.pack(padx=10, pady=6, fill="x")
         Label(top_frame, text="Devices:", font=("Segoe UI", 10, "bold")).pack(anchor="w")
-        cols = ("Name","IP","Port","Users","Punches","Status")
-        self.tree_devices = ttk.Treeview(top_frame, columns=cols, show="headings", height=6, selectmode="extended")
-        for c in cols:
-            self.tree_devices.heading(c, text=c)
-            width = 220 if c=="Name" else 140
-            if c in ("Users","Punches","Port","Status"): width = 100
-            self.tree_devices.column(c, width=width, anchor="center")
-        self.tree_devices.pack(fill="x", pady=5)
-        for d in self.devices:
-            name, ip, port = d.get("name"), d.get("ip"), d.get("port",4370)
-            self.tree_devices.insert("", END, values=(name, ip, port, "-", "-", "Disconnected"))
+        self.fleet = FleetTable(top_frame, root, self.devices)  # indexed by IP, repaints at a capped rate
 
         btn_frame = Frame(top_frame)
         btn_frame.pack(fill="x", pady=4)
@@ -79,8 +111,10 @@ class ZKRealtimeApp:
         Button(btn_frame, text="Disconnect Selected", command=self.disconnect_selected, width=18, bg="#f44336", fg="white").pack(side=LEFT, padx=4)
         Button(btn_frame, text="Clear Logs", command=self.clear_logs, width=12).pack(side=LEFT, padx=12)
         Button(btn_frame, text="Punch Logs", command=self.open_filtered_window, width=18, bg="#2196F3", fg="white").pack(side=LEFT, padx=8)
+        Button(btn_frame, text="Throughput", command=self.open_throughput_window, width=12).pack(side=LEFT, padx=4)
         Checkbutton(btn_frame, text="Auto-connect on startup", variable=self.auto_connect_var).pack(side=LEFT, padx=20)
         Label(top_frame, textvariable=self.status_var, font=("Segoe UI", 9, "bold")).pack(anchor="e")
+        Label(top_frame, textvariable=self.pipeline_var, font=("Segoe UI", 8), fg="gray").pack(anchor="e")
 
         # --- Main Frame ---
         main_frame = Frame(root)
@@ -98,90 +132,275 @@ class ZKRealtimeApp:
         self.tree_logs.pack(fill=BOTH, expand=True)
         self.tree_logs.tag_configure('oddrow', background='#f8f8f8')
         self.tree_logs.tag_configure('evenrow', background='#ffffff')
+        self.tree_logs.tag_configure('alert', background='#ffd6d6')
 
         # --- Right: User List ---
         right_frame = Frame(main_frame, width=320)
         right_frame.pack(side=RIGHT, fill=Y, padx=(10,0))
-        Label(right_frame, text="User List (Selected Device):", font=("Segoe UI", 10, "bold")).pack(anchor="w")
-        self.tree_users = ttk.Treeview(right_frame, columns=("User ID","Name"), show="headings", height=25)
-        self.tree_users.heading("User ID", text="User ID")
-        self.tree_users.heading("Name", text="Name")
-        self.tree_users.column("User ID", width=90, anchor="center")
-        self.tree_users.column("Name", width=200)
-        self.tree_users.pack(fill=Y, expand=True)
+        Label(right_frame, text="Users (All Devices):", font=("Segoe UI", 10, "bold")).pack(anchor="w")
+        self.user_panel = UserPanel(right_frame, self.directory)
 
+        self.root.after_idle(self.on_first_paint)
+        self.devices_watcher = DevicesWatcher(self.devices, lambda devices, diff: self.post_ui("devices", devices, diff)).start()
+        self.root.after(UI_PUMP_MS, self.pump_ui_queue)
         if self.auto_connect_var.get():
             self.root.after(800, self.auto_connect_all)
 
-    # --- Device Table ---
-    def set_device_row(self, ip, users="-", punches="-", status="Disconnected", color="black"):
-        for iid in self.tree_devices.get_children():
-            vals = list(self.tree_devices.item(iid, "values"))
-            if vals[1]==ip:
-                vals[3], vals[4], vals[5] = users, punches, status
-                self.tree_devices.item(iid, values=vals, tags=('status',))
-                self.tree_devices.tag_configure('status', foreground=color)
-                break
+    # --- Startup ---
+    def on_first_paint(self):
+        print(f"First paint in {(time.perf_counter() - STARTUP_T0) * 1000:.0f} ms")
+        threading.Thread(target=self.load_state, daemon=True).start()
+
+    def load_state(self):
+        t0 = time.perf_counter()
+        from punch_store import PunchStore
+        from replication import load_replicator
+        self.last_logs = load_processed_logs()
+        self.last_logs.can_compact = lambda: self.leases.try_acquire("index")
+        self.leases.start(on_lost=self.sessions.close)
+        self.sinks = start_sinks()
+        self.rules, self.alerts = start_rules()
+        self.store = PunchStore()
+        self.replicator = load_replicator()  # None unless replication.json exists
+        if self.replicator:
+            self.replicator.can_ship = lambda: self.leases.try_acquire("replication")  # one shipper per store
+            self.replicator.start()
+        needs_backfill = len(self.last_logs) and not self.store.count()
+        self.index_ready.set()
+        if API_PORT:
+            from query_api import start_api
+            try: self.api = start_api(port=API_PORT)
+            except OSError as e: print(f"Query API not started: {e}")
+        threading.Thread(target=self.run_ingest, daemon=True).start()
+        threading.Thread(target=self.run_transport_checks, daemon=True).start()
+        threading.Thread(target=self.run_stream_consumer, daemon=True).start()
+        self.post_ui("pipeline")
+        self.post_ui("status", f"📂 {len(self.last_logs)} processed punches indexed in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        if needs_backfill:
+            # one-time import of history that predates the store (user + time only)
+            n = self.store.backfill_keys(self.last_logs)
+            self.post_ui("status", f"📂 Imported {n} historical punches into the punch store")
+
+    # --- UI queue: worker threads never touch Tk directly ---
+    def post_ui(self, kind, *args):
+        if kind in DROPPABLE_UI: self.ui_queue.put((kind, args))
+        else: self.control_queue.put((kind, args))
+
+    def pump_ui_queue(self):
+        handlers = {
+            "device": self.fleet.update,
+            "status": self.status_var.set,
+            "punch": self.add_log_row,
+            "alert": lambda alert: self.status_var.set(f"🚨 {alert['message']}"),
+            "users": self.refresh_user_panel,
+            "pipeline": self.update_pipeline_stats,
+            "devices": self.apply_device_changes,
+            "call": lambda fn, *a: fn(*a),
+        }
+        control = []
+        while True:
+            try: control.append(self.control_queue.get_nowait())
+            except queue.Empty: break
+        for kind, args in control + self.ui_queue.get_many(UI_PUMP_BATCH, timeout=0):
+            try: handlers[kind](*args)
+            except Exception as e: print(f"UI update {kind} failed: {e}")
+        self.root.after(UI_PUMP_MS, self.pump_ui_queue)
+
+    def update_pipeline_stats(self):
+        q = self.ingest_queue.stats()
+        parts = [f"Ingest queue: {q['depth']} (avg {q['wait_avg']:.2f}s, max {q['wait_max']:.1f}s)"]
+        if q["spilled"]: parts[0] += f", {q['spilled']} spilled"
+        u = self.ui_queue.stats()
+        if u["dropped"]: parts.append(f"UI dropped {u['dropped']}")
+        polled = sum(self.leases.holds(d["ip"]) for d in self.devices)
+        if polled < len(self.devices): parts.append(f"Polling {polled}/{len(self.devices)} devices")
+        parts.append(f"{self.throughput.snapshot()[FLEET]['per_minute']:.1f} punches/min")
+        if self.rules.fired: parts.append(f"🚨 {self.rules.fired} alert(s)")
+        if self.replicator and self.leases.holds("replication"):
+            r = self.replicator.lag()
+            parts.append(f"central: {r['backlog']} behind" + (" ⚠️" if r["last_error"] else ""))
+        for name, lag in self.sinks.lag().items():
+            part = f"{name}: {lag['pending']} pending"
+            if lag["pending"]: part += f" ({lag['oldest_age']:.0f}s)"
+            if lag["last_error"]: part += " ⚠️"
+            parts.append(part)
+        self.pipeline_var.set(" · ".join(parts))
+        self.root.after(2000, self.update_pipeline_stats)
+
+    # --- Ingest consumer: dedup index + sinks, off the listener threads ---
+    def run_ingest(self):
+        while True:
+            punches = self.ingest_queue.get_many(500, timeout=1)
+            if not punches: continue
+            with self.last_logs.reading():
+                fresh = [p for p in punches if p["key"] not in self.last_logs]
+            alerted = set()
+            try:
+                save_processed_logs(self.last_logs, [p["key"] for p in fresh])
+                self.sinks.emit(fresh)
+                alerts = self.rules.evaluate_many(fresh)
+                if alerts:
+                    self.alerts.emit(alerts)
+                    alerted = {(a["user_id"], a["timestamp"]) for a in alerts}
+                    for a in alerts: self.post_ui("alert", a)
+            except Exception as e:
+                print(f"Ingest error: {e}")
+            with self.pending_lock:
+                self.pending_keys.difference_update(p["key"] for p in punches)
+            self.record_punches(fresh)
+            for p in fresh:
+                self.post_ui("punch", p, (p["user_id"], p["timestamp"]) in alerted)
+
+    # --- Punches polled by other instances (they hold those devices' leases) ---
+    def run_stream_consumer(self):
+        stream = PunchStream(self.store.path, cursor=LATEST)
+        while True:
+            time.sleep(STREAM_POLL_SECONDS)
+            try:
+                rows = stream.fetch()
+                if not rows: continue
+                # our own punches are indexed before they reach the store, so only foreign ones pass
+                with self.last_logs.reading():
+                    foreign = [p for p in ({**dict(r), "key": f"{r['user_id']}_{r['timestamp']}"} for r in rows)
+                               if p["key"] not in self.last_logs]
+                save_processed_logs(self.last_logs, [p["key"] for p in foreign])
+                self.record_punches(foreign)
+                for p in foreign:
+                    self.post_ui("punch", p)
+            except Exception as e:
+                print(f"Stream consumer error: {e}")
+
+    def record_punches(self, punches):
+        for ip, n in Counter(p.get("ip") for p in punches).items():
+            self.throughput.record_punches(ip, n)
+
+    # --- Transport calibration ---
+    def connect_device(self, ip, port):
+        device = next((d for d in self.devices if d.get("ip") == ip), None)
+        return connect_device(ip, port, **transport_settings(device))
+
+    def run_transport_checks(self):
+        from transport_tuning import is_due, calibrate_device, save_transport
+        while True:
+            time.sleep(TRANSPORT_CHECK_MINUTES * 60)
+            for d in list(self.devices):
+                session = self.sessions.get(d["ip"])
+                if not is_due(d) or not self.running_flags.get(d["ip"]) or session is None or not session.is_open:
+                    continue
+                self.post_ui("status", f"📏 Calibrating transport for {d.get('name')}...")
+                try:
+                    # the session's connection is closed while measuring (one connection per terminal),
+                    # and its polls wait in the queue instead of competing
+                    t = session.call_exclusive(lambda: calibrate_device(d["ip"], d.get("port", 4370)), BACKGROUND)
+                except Exception as e:
+                    print(f"Transport calibration for {d['ip']} failed: {e}")
+                    continue
+                if t is not None:
+                    save_transport(d, t, DEVICES_FILE)  # the devices watcher applies it
+                    self.post_ui("status", f"📏 {d.get('name')}: {'UDP' if t['udp'] else 'TCP'}, timeout {t['timeout']}s")
+
+    def on_close(self):
+        if self.index_ready.is_set():
+            try: self.last_logs.close()
+            except Exception as e: print(f"Error saving punch index: {e}")
+            if self.replicator: self.replicator.stop()  # before its lease is handed back
+            self.leases.stop()
+            self.sinks.stop()
+            self.alerts.stop()
+            self.store.close()
+        self.sessions.shutdown()
+        self.root.destroy()
 
     # --- Real-time Punch Log ---
-    def add_log_row(self, device_name, log, user_name):
+    def add_log_row(self, punch, alerted=False):
         self.sl_counter += 1
-        tag = 'evenrow' if self.sl_counter % 2 == 0 else 'oddrow'
-        ts = log.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        p_type = get_punch_type(log)
-        self.tree_logs.insert("", END, values=(self.sl_counter, log.user_id, user_name, ts, p_type, device_name), tags=(tag,))
+        tag = 'alert' if alerted else 'evenrow' if self.sl_counter % 2 == 0 else 'oddrow'
+        p_type = get_punch_type(punch["punch"])
+        self.tree_logs.insert("", END, values=(self.sl_counter, punch["user_id"], punch["name"] or "Unknown", punch["timestamp"], p_type, punch["device"]), tags=(tag,))
         # Keep only latest MAX_LOGS entries
         all_items = self.tree_logs.get_children()
         if len(all_items) > MAX_LOGS:
             self.tree_logs.delete(all_items[0])
         self.tree_logs.yview_moveto(1)
 
-    def refresh_user_panel(self, users_dict):
-        self.uid_name_map.update(users_dict)
-        def do():
-            for i in self.tree_users.get_children(): self.tree_users.delete(i)
-            for uid, name in users_dict.items():
-                self.tree_users.insert("", END, values=(uid, name))
-        self.root.after(0, do)
+    def refresh_user_panel(self, ip, device_name, users_dict):
+        added, changed, removed = self.directory.update_device(ip, users_dict, device_name)
+        if added or changed or removed:
+            self.user_panel.refresh()
 
     # --- Connect / Disconnect ---
+    def start_listener(self, name, ip, port):
+        if ip in self.device_threads and self.device_threads[ip].is_alive() and self.running_flags.get(ip): return
+        t = threading.Thread(target=self.run_listener, args=(name, ip, port), daemon=True)
+        self.device_threads[ip] = t
+        t.start()
+
+    def stop_listener(self, ip):
+        self.running_flags[ip] = None
+        self.sessions.close(ip)
+        self.leases.release(ip)  # another instance may take the device over
+
     def connect_selected(self):
-        selected = self.tree_devices.selection()
+        selected = self.fleet.selected()
         if not selected:
             self.status_var.set("⚠️ Select device(s) to connect.")
             return
-        for iid in selected:
-            vals = self.tree_devices.item(iid, "values")
-            ip = vals[1]
-            port = int(vals[2])
-            if ip in self.device_threads and self.device_threads[ip].is_alive(): continue
-            t = threading.Thread(target=self.run_listener, args=(vals[0], ip, port), daemon=True)
-            self.device_threads[ip] = t
-            t.start()
+        for row in selected:
+            self.start_listener(row["name"], row["ip"], int(row["port"]))
 
     def disconnect_selected(self):
-        selected = self.tree_devices.selection()
+        selected = self.fleet.selected()
         if not selected:
             self.status_var.set("⚠️ Select device(s) to disconnect.")
             return
-        for iid in selected:
-            vals = self.tree_devices.item(iid,"values")
-            ip = vals[1]
-            self.running_flags[ip] = False
-            if ip in self.connections:
-                try: self.connections[ip].disconnect()
-                except: pass
-                del self.connections[ip]
-            self.set_device_row(ip, status="Disconnected", color="red")
+        for row in selected:
+            self.stop_listener(row["ip"])
+            self.fleet.update(row["ip"], status="Disconnected", color="red")
         self.status_var.set("🔌 Selected devices disconnected.")
 
+    # --- Live devices.json reload: only touched devices are restarted ---
+    def apply_device_changes(self, devices, diff):
+        added, removed, changed, updated = diff
+        self.devices = devices
+        for d in removed:
+            self.stop_listener(d["ip"])
+            self.sessions.remove(d["ip"])
+            self.fleet.remove(d["ip"])
+            self.throughput.forget(d["ip"])
+            if any(self.directory.remove_device(d["ip"])): self.user_panel.refresh()
+        for old, new in changed:
+            was_running = bool(self.running_flags.get(old["ip"]))
+            self.stop_listener(old["ip"])
+            self.sessions.remove(old["ip"])
+            self.fleet.remove(old["ip"])
+            self.fleet.add(new)
+            self.throughput.forget(old["ip"])
+            if any(self.directory.remove_device(old["ip"])): self.user_panel.refresh()  # re-read under the new address
+            self.pollers[new["ip"]] = poller_for_device(new)
+            if was_running: self.start_listener(new.get("name"), new["ip"], new.get("port",4370))
+        for old, new in updated:
+            self.fleet.edit(new)  # floor and other table columns
+            self.pollers[new["ip"]] = poller_for_device(new)
+            if transport_settings(old) != transport_settings(new):
+                self.sessions.close(new["ip"])  # the listener reconnects with the new settings
+        for d in added:
+            self.fleet.add(d)
+            self.pollers[d["ip"]] = poller_for_device(d)
+            if self.auto_connect_var.get(): self.start_listener(d.get("name"), d["ip"], d.get("port",4370))
+        self.status_var.set(f"🔄 {DEVICES_FILE} reloaded: +{len(added)} -{len(removed)} ~{len(changed)} address change(s)")
+
     def clear_logs(self):
         for i in self.tree_logs.get_children(): self.tree_logs.delete(i)
         self.sl_counter = 0
         self.status_var.set("🧹 Punch logs cleared (UI only).")
 
+    def open_throughput_window(self):
+        ThroughputWindow(self.root, self.throughput, lambda: {d["ip"]: d.get("name") for d in self.devices})
+
     # --- Filtered / Searchable Punch Log Window ---
     def open_filtered_window(self):
+        from tkinter import font
+        from tkcalendar import DateEntry
         win = Toplevel(self.root)
         win.title("Punch Logs")
         win.geometry("900x600")
@@ -191,19 +410,24 @@ class ZKRealtimeApp:
         user_listbox = Listbox(win, selectmode=MULTIPLE, height=10)
         user_listbox.pack(fill="x", padx=10)
 
-        all_users = []
-        for conn_name, conn in self.connections.items():
-            try:
-                users = conn.get_users()  # Make sure this returns a list of user objects
-                print(f"{conn_name} returned {len(users)} users")  # Debug
-                for u in users:
-                    all_users.append(f"{u.user_id} - {u.name}")
-            except Exception as e:
-                print(f"Error getting users from {conn_name}: {e}")
-
-        # Insert into listbox
-        for u in sorted(all_users):
-            user_listbox.insert(END, u)
+        # Filled from the user directory at once, then again once the live
+        # sessions (asked ahead of queued background polls) have refreshed it
+        def fill():
+            if not user_listbox.winfo_exists(): return
+            user_listbox.delete(0, END)
+            for uid in self.directory.search():
+                user_listbox.insert(END, f"{uid} - {self.directory.name(uid, '')}")
+        fill()
+        names = {d["ip"]: d.get("name") for d in self.devices}
+        futures = {s.ip: s.submit(lambda c: c.get_users(), INTERACTIVE) for s in self.sessions.live()}
+        def collect_users():
+            for ip, fut in futures.items():
+                try:
+                    self.post_ui("users", ip, names.get(ip, ip), {u.user_id: u.name for u in fut.result()})
+                except Exception as e:
+                    print(f"Error getting users from {ip}: {e}")
+            self.post_ui("call", fill)
+        threading.Thread(target=collect_users, daemon=True).start()
 
         # --- Date/Time Filters + Buttons ---
         date_frame = Frame(win)
@@ -227,89 +451,147 @@ class ZKRealtimeApp:
         to_time.insert(0, "23:59")
         to_time.grid(row=1, column=3, padx=5)
 
-        # --- Treeview for Logs ---
+        # --- Treeview for Logs (one page rendered at a time, more on scroll) ---
+        info_var = StringVar(value="")
+        Label(win, textvariable=info_var, fg="gray").pack(anchor="e", padx=10)
+        tree_frame = Frame(win)
+        tree_frame.pack(fill="both", expand=True, padx=10, pady=10)
         cols = ("SL","User ID","Name","Timestamp","Punch Type","Device Name")
-        tree = ttk.Treeview(win, columns=cols, show="headings")
+        tree = ttk.Treeview(tree_frame, columns=cols, show="headings")
+        scroll = Scrollbar(tree_frame, orient="vertical", command=tree.yview)
+        state = {"query": None, "total": 0, "shown": 0, "order": "timestamp", "desc": False, "loading": False}
+
+        def on_scroll(first, last):
+            scroll.set(first, last)
+            if float(last) > 0.9 and state["query"] and not state["query"].exhausted and not state["loading"]:
+                state["loading"] = True
+                win.after_idle(load_page)
+
+        tree.configure(yscrollcommand=on_scroll)
         for c in cols:
-            tree.heading(c, text=c)
+            tree.heading(c, text=c, command=lambda c=c: sort_by(c))
             tree.column(c, width=140 if c != "Device Name" else 180)
-        tree.pack(fill="both", expand=True, padx=10, pady=10)
+        scroll.pack(side=RIGHT, fill=Y)
+        tree.pack(side=LEFT, fill="both", expand=True)
+
+        def load_page():
+            q = state["query"]
+            rows = q.next_page()
+            for r in rows:
+                state["shown"] += 1
+                name = r["name"] or self.directory.name(r["user_id"], r["user_id"])
+                p_type = get_punch_type(r["punch"]) if r["punch"] is not None else "Unknown"
+                tree.insert("", END, values=(state["shown"], r["user_id"], name, r["timestamp"], p_type, r["device"] or "Unknown"))
+            info_var.set(f"Showing {state['shown']:,} of {state['total']:,} · query {q.elapsed * 1000:.0f} ms")
+            state["loading"] = False
+
+        def sort_by(col):
+            order = SEARCH_SORT_COLUMNS[col]
+            state["desc"] = not state["desc"] if state["order"] == order else False
+            state["order"] = order
+            if state["query"]: search()
 
         # --- Search Function ---
         def search():
             tree.delete(*tree.get_children())
+            if not self.index_ready.is_set():
+                self.status_var.set("⏳ Punch history is still loading...")
+                return
             selected_users = [user_listbox.get(i).split(" - ")[0] for i in user_listbox.curselection()]
             from_dt = datetime.strptime(f"{from_cal.get_date()} {from_time.get()}:00", "%Y-%m-%d %H:%M:%S")
             to_dt = datetime.strptime(f"{to_cal.get_date()} {to_time.get()}:59", "%Y-%m-%d %H:%M:%S")
-            sl = 0
-            for log_key in self.last_logs:
-                uid, ts_str = log_key.split("_")
-                ts = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
-                if uid in selected_users and from_dt <= ts <= to_dt:
-                    sl += 1
-                    name = self.uid_name_map.get(uid, uid)
-                    tree.insert("", END, values=(sl, uid, name, ts_str, "Unknown", "Unknown"))
+            # no selection = everybody; sorting and paging happen in SQLite
+            q = self.store.query(user_ids=selected_users or None, start=from_dt.strftime("%Y-%m-%d %H:%M:%S"),
+                                 end=to_dt.strftime("%Y-%m-%d %H:%M:%S"), order_by=state["order"],
+                                 descending=state["desc"], page_size=SEARCH_PAGE_SIZE)
+            state.update(query=q, total=q.count(), shown=0, loading=True)
+            load_page()
+
+        def clear():
+            tree.delete(*tree.get_children())
+            state.update(query=None, total=0, shown=0)
+            info_var.set("")
 
         # --- Buttons in same row as To Date/Time ---
         bold_font = font.Font(weight="bold")
         Button(date_frame, text="Search", command=search, font=bold_font).grid(row=1, column=4, padx=10)
-        Button(date_frame, text="Clear", command=lambda: tree.delete(*tree.get_children()), font=bold_font).grid(row=1, column=5, padx=10)
+        Button(date_frame, text="Clear", command=clear, font=bold_font).grid(row=1, column=5, padx=10)
 
-        
     # --- Auto-connect ---
     def auto_connect_all(self):
         for d in self.devices:
-            name,ip,port=d.get("name"),d.get("ip"),d.get("port",4370)
-            t = threading.Thread(target=self.run_listener,args=(name,ip,port),daemon=True)
-            self.device_threads[ip] = t
-            t.start()
+            self.start_listener(d.get("name"), d.get("ip"), d.get("port",4370))
 
     # --- Listener Thread ---
     def run_listener(self, device_name, ip, port):
-        self.running_flags[ip] = True
-        while self.running_flags.get(ip, False):
+        from zk.exception import ZKNetworkError
+        from punch_store import make_punch
+        token = self.running_flags[ip] = object()
+        running = lambda: self.running_flags.get(ip) is token
+        if ip not in self.pollers:
+            self.pollers[ip] = poller_for_device(next((d for d in self.devices if d.get("ip") == ip), None))
+        self.index_ready.wait()
+        session = self.sessions.session(ip, port)
+        while running():
+            if not self.leases.try_acquire(ip):
+                holder = self.leases.owner_of(ip) or {}
+                self.post_ui("device", ip, "-", "-", f"Standby ({holder.get('host', 'other instance')})", "gray")
+                self.reconnects.wait(RENEW_EVERY, lambda: not running())
+                continue
             try:
-                self.root.after(0, lambda: self.set_device_row(ip,status="Connecting...",color="orange"))
-                self.root.after(0, lambda: self.status_var.set(f"⚙️ Connecting to {device_name} ({ip})..."))
-                conn = connect_device(ip, port)
-                self.connections[ip] = conn
-                self.root.after(0, lambda: self.set_device_row(ip,status="Connected",color="green"))
-                self.root.after(0, lambda: self.status_var.set(f"✅ Connected: {device_name} ({ip})"))
-
-                users = {u.user_id:u.name for u in conn.get_users()}
-                self.root.after(0, lambda users=users: self.refresh_user_panel(users))
-
-                while self.running_flags.get(ip, False):
-                    logs = conn.get_attendance()
-                    if logs:
-                        new_entries = [lg for lg in logs if get_log_key(lg) not in self.last_logs]
-                        if new_entries:
-                            for log in new_entries:
-                                key = get_log_key(log)
-                                self.last_logs.add(key)
-                                user_name = users.get(log.user_id, "Unknown")
-                                self.root.after(0, lambda device_name=device_name, log=log, user_name=user_name: self.add_log_row(device_name, log, user_name))
-                            save_processed_logs(self.last_logs)
-                    self.root.after(0, lambda: self.set_device_row(ip, users=len(users), punches=len(logs), status="Connected", color="green"))
-                    time.sleep(3)
+                self.post_ui("device", ip, "-", "-", "Connecting...", "orange")
+                self.post_ui("status", f"⚙️ Connecting to {device_name} ({ip})...")
+                with self.reconnects.connect_slot():
+                    session.open()
+                self.reconnects.on_connected(ip)
+                self.post_ui("device", ip, "-", "-", "Connected", "green")
+                self.post_ui("status", f"✅ Connected: {device_name} ({ip})")
+
+                roster = session.call(lambda c: c.get_users())
+                users = {u.user_id: u.name for u in roster}
+                self.post_ui("users", ip, device_name, users)
+                self.store.save_users(device_name, ip, users)
+                self.rules.add_users(users)
+
+                self.pollers[ip].reset()
+                while running() and self.leases.holds(ip):
+                    t0 = time.perf_counter()
+                    try:
+                        cols = session.call(lambda c: read_attendance(c, roster), BACKGROUND)
+                    except Exception:
+                        self.throughput.record_fetch(ip, time.perf_counter() - t0, ok=False)
+                        raise
+                    self.throughput.record_fetch(ip, time.perf_counter() - t0)
+                    with self.pending_lock, self.last_logs.reading():
+                        fresh = cols.select(lambda k: k not in self.pending_keys and k not in self.last_logs)
+                        self.pending_keys.update(k for _, k in fresh)
+                    for log in cols.records(i for i, _ in fresh):
+                        self.ingest_queue.put(make_punch(log, device_name, ip, users.get(log.user_id)))
+                    interval = self.pollers[ip].next_interval(len(fresh))
+                    self.post_ui("device", ip, len(users), len(cols), f"Connected ({interval:.0f}s)", "green")
+                    self.reconnects.wait(interval, lambda: not running())
 
             except ZKNetworkError:
-                self.root.after(0, lambda: self.set_device_row(ip,status="Disconnected",color="red"))
-                self.root.after(0, lambda: self.status_var.set(f"⚠️ Connection lost: {device_name} ({ip})"))
-                time.sleep(5)
+                self.post_ui("device", ip, "-", "-", "Disconnected", "red")
+                self.post_ui("status", f"⚠️ Connection lost: {device_name} ({ip})")
             except Exception as e:
-                self.root.after(0, lambda: self.set_device_row(ip,status="Disconnected",color="red"))
-                self.root.after(0, lambda: self.status_var.set(f"❌ Error {device_name} ({ip}): {e}"))
-                time.sleep(5)
+                self.post_ui("device", ip, "-", "-", "Disconnected", "red")
+                self.post_ui("status", f"❌ Error {device_name} ({ip}): {e}")
             finally:
-                try: conn.disconnect()
-                except: pass
-                if ip in self.connections: del self.connections[ip]
-                time.sleep(2)
+                try: session.close().result()
+                except Exception: pass
+
+            if not running(): break
+            if not self.leases.holds(ip): continue  # lost the lease: go to standby, no backoff
+            delay = self.reconnects.on_failure(ip)
+            self.post_ui("device", ip, "-", "-", f"Retry in {delay:.0f}s", "red")
+            self.reconnects.wait(delay, lambda: not running())
+        self.reconnects.reset(ip)
 
 def main():
     root = Tk()
     app = ZKRealtimeApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
 
 if __name__ == "__main__":